@@ -0,0 +1,55 @@
+"""Microbenchmarks for the local panel frame codec.
+
+Run from the repository root with `python -m benchmarks.crypt_benchmark`.
+"""
+import base64
+import timeit
+from pyrisco.local.risco_crypt import RiscoCrypt, CRC_ARRAY_BASE64, _create_pseudo_buffer
+
+PANEL_ID = 0x1234
+NUMBER = 20000
+
+
+def _per_byte_xor(crypt, chars):
+  # The original implementation: one Python call per byte
+  return bytes(map(lambda c, p: c ^ crypt._pseudo_buffer[p], chars, range(len(chars))))
+
+
+def _report(name, seconds, unit='frame'):
+  print(f'{name:<40} {seconds / NUMBER * 1e6:8.2f} us/{unit}')
+
+
+def bench_xor():
+  crypt = RiscoCrypt()
+  crypt.set_panel_id(PANEL_ID)
+  frame = b'12ZSTT12=--------O-----------\x17ABCD'
+  _report('xor, per byte (before)', timeit.timeit(lambda: _per_byte_xor(crypt, frame), number=NUMBER))
+  _report('xor, bulk (after)', timeit.timeit(lambda: crypt._xor(frame), number=NUMBER))
+
+
+def bench_frames():
+  crypt = RiscoCrypt()
+  crypt.set_panel_id(PANEL_ID)
+  encoded = bytes(crypt.encode(12, 'ZSTT12=--------O-----------', True))
+  _report('encode, encrypted', timeit.timeit(lambda: crypt.encode(12, 'CLOCK', True), number=NUMBER))
+  _report('decode, encrypted', timeit.timeit(lambda: crypt.decode(encoded), number=NUMBER))
+
+
+def bench_startup():
+  # What every connect used to pay: parse the CRC table and rerun the keystream LFSR
+  def _uncached():
+    list(map(int, base64.b64decode(CRC_ARRAY_BASE64).decode("utf-8")[1:-1].split(',')))
+    _create_pseudo_buffer.__wrapped__(PANEL_ID)
+
+  def _cached():
+    crypt = RiscoCrypt()
+    crypt.set_panel_id(PANEL_ID)
+
+  _report('startup, uncached (before)', timeit.timeit(_uncached, number=NUMBER), 'connect')
+  _report('startup, cached (after)', timeit.timeit(_cached, number=NUMBER), 'connect')
+
+
+if __name__ == '__main__':
+  bench_xor()
+  bench_frames()
+  bench_startup()
@@ -0,0 +1,102 @@
+"""Zone discovery against a simulated panel, for every model in panels.PANELS.
+
+The simulated panel answers one command at a time after a fixed service time,
+behind a fixed network round trip, through the same command window RiscoSocket
+uses. A quarter of the zones are configured.
+
+Run from the repository root with `python -m benchmarks.discovery_benchmark`.
+"""
+import asyncio
+import time
+from pyrisco.common import OperationError
+from pyrisco.local.command_window import CommandWindow
+from pyrisco.local.const import MAX_ZONES, PRIORITY_BULK
+from pyrisco.local.discovery import ZoneDiscovery
+from pyrisco.local.panels import PANELS, panel_capabilities
+
+NETWORK_RTT = 0.004
+SERVICE_TIME = 0.0004
+CONCURRENCY = [4, 16]
+FIRMWARE = '3.0.0.7'
+
+
+class SimulatedPanel:
+  def __init__(self, max_zones, legacy_panel, concurrency):
+    self._configured = set(range(1, max_zones + 1, 4))
+    self._legacy_panel = legacy_panel
+    self._window = CommandWindow(concurrency)
+    self._busy = asyncio.Lock()
+    self.commands = 0
+
+  async def send_result_command(self, command, priority=PRIORITY_BULK):
+    await self._window.acquire(priority)
+    try:
+      self.commands += 1
+      await asyncio.sleep(NETWORK_RTT / 2)
+      async with self._busy:
+        await asyncio.sleep(SERVICE_TIME)
+      await asyncio.sleep(NETWORK_RTT / 2)
+      return self._answer(command)
+    finally:
+      self._window.release(NETWORK_RTT)
+
+  def _answer(self, command):
+    zone_id = int(''.join(c for c in command if c.isdigit()))
+    configured = zone_id in self._configured
+    if command.startswith('ZTYPE'):
+      return '3' if configured else '0'
+    if command.startswith('ZLNKTYP'):
+      return 'W'
+    if command.startswith('ZSTT'):
+      return '------------'
+    if command.startswith('ZPART'):
+      return '1'
+    if command.startswith('ZAREA'):
+      return '1'
+    if command.startswith('ZLBL'):
+      return f'Zone {zone_id}'
+    raise OperationError(command)
+
+
+async def _per_zone_chains(rs, legacy_panel, zone_ids):
+  # The previous discovery: one task per zone id, each walking its own chain of commands
+  async def _zone(zone_id):
+    if int(await rs.send_result_command(f'ZTYPE*{zone_id}?')) == 0:
+      return None
+    if not legacy_panel:
+      await rs.send_result_command(f'ZLNKTYP{zone_id}?')
+    await rs.send_result_command(f'ZSTT*{zone_id}?')
+    await rs.send_result_command(f'ZLBL*{zone_id}?')
+    await rs.send_result_command(f'ZPART&*{zone_id}?')
+    if not legacy_panel:
+      await rs.send_result_command(f'ZAREA&*{zone_id}?')
+    return zone_id
+  return [z for z in await asyncio.gather(*[_zone(i) for i in zone_ids]) if z]
+
+
+async def _staged(rs, legacy_panel, zone_ids):
+  return await ZoneDiscovery(rs, legacy_panel, lambda *args: args).run(zone_ids)
+
+
+async def _measure(discover, panel_type, concurrency):
+  legacy_panel = not panel_type.startswith('RP')
+  max_zones = panel_capabilities(panel_type, FIRMWARE)[MAX_ZONES]
+  rs = SimulatedPanel(max_zones, legacy_panel, concurrency)
+  start = time.monotonic()
+  zones = await discover(rs, legacy_panel, range(1, max_zones + 1))
+  return len(zones), rs.commands, time.monotonic() - start
+
+
+async def main():
+  for concurrency in CONCURRENCY:
+    print(f'concurrency {concurrency}')
+    print(f'{"panel":<8} {"zones":>5} {"found":>5} {"chains cmds":>11} {"chains s":>8} {"staged cmds":>11} {"staged s":>8}')
+    for panel_type in PANELS:
+      max_zones = panel_capabilities(panel_type, FIRMWARE)[MAX_ZONES]
+      found, chain_commands, chain_time = await _measure(_per_zone_chains, panel_type, concurrency)
+      found, staged_commands, staged_time = await _measure(_staged, panel_type, concurrency)
+      print(f'{panel_type:<8} {max_zones:>5} {found:>5} {chain_commands:>11} {chain_time:>8.2f} {staged_commands:>11} {staged_time:>8.2f}')
+
+
+if __name__ == '__main__':
+  asyncio.run(main())
@@ -0,0 +1,79 @@
+"""Memory per zone and property access time for the local status models.
+
+Compares the slotted, bitmask based Zone with the previous implementation,
+which kept the raw status string and searched it on every property access.
+
+Run from the repository root with `python -m benchmarks.model_benchmark`.
+"""
+import timeit
+import tracemalloc
+from pyrisco.common import GROUP_ID_TO_NAME
+from pyrisco.local.zone import Zone
+
+ZONES = 512
+NUMBER = 200
+STATUS = '---A--------'
+
+
+class PreviousZone:
+  def __init__(self, panel, zone_id, status, zone_type, label, partitions, groups, tech):
+    self._panel = panel
+    self._id = zone_id
+    self._status = status
+    self._type = zone_type
+    self._name = label.strip()
+    self._partitions = partitions
+    self._groups = int(groups, 16)
+    self._tech = tech
+
+  @property
+  def triggered(self):
+    return 'O' in self._status
+
+  @property
+  def bypassed(self):
+    return 'Y' in self._status
+
+  @property
+  def armed(self):
+    return 'A' in self._status
+
+  @property
+  def groups(self):
+    return [GROUP_ID_TO_NAME[i] for i in range(0,4) if ((2**i) & self._groups) > 0]
+
+  @property
+  def partitions(self):
+    ps = zip([int(p, 16) for p in self._partitions], range(0, len(self._partitions)))
+    return [i*4 + p + 1 for c, i in ps for p in range(0,4) if ((2**p) & c) > 0]
+
+
+def _create(cls):
+  return [cls(None, i, STATUS, 3, f'Zone {i}', '30', '1', 'W') for i in range(1, ZONES + 1)]
+
+
+def _memory(cls):
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  zones = _create(cls)
+  after = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return (after - before) / len(zones)
+
+
+def _refresh(zones):
+  # What a dashboard does for every zone on every refresh
+  for z in zones:
+    z.triggered, z.bypassed, z.armed, z.groups, z.partitions
+
+
+def main():
+  print(f'{"model":<10} {"bytes/zone":>10} {"us/zone refresh":>16}')
+  for name, cls in [('previous', PreviousZone), ('current', Zone)]:
+    zones = _create(cls)
+    seconds = timeit.timeit(lambda: _refresh(zones), number=NUMBER)
+    print(f'{name:<10} {_memory(cls):>10.0f} {seconds / NUMBER / ZONES * 1e6:>16.3f}')
+
+
+if __name__ == '__main__':
+  main()
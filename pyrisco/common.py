@@ -2,6 +2,7 @@ GROUP_ID_TO_NAME = ["A", "B", "C", "D"]
 
 class Partition:
   """A representation of a Risco partition."""
+  __slots__ = ()
 
   async def disarm(self):
     """Disarm the partition."""
@@ -62,6 +63,7 @@ class Partition:
 
 class Zone:
   """A representation of a Risco zone."""
+  __slots__ = ()
 
   async def bypass(self, bypass):
     """Bypass or unbypass the zone."""
@@ -90,6 +92,7 @@ class Zone:
 
 class System:
   """A representation of a Risco System."""
+  __slots__ = ()
 
   @property
   def name(self):
@@ -0,0 +1,110 @@
+import asyncio
+from collections import deque
+
+QUARANTINE_PERIOD = 30
+
+
+class CommandIdAllocator:
+  """Hands out command ids without reusing one that is still in flight.
+
+  Free ids are kept in rotation order. An id whose command timed out is
+  quarantined until its late reply arrives or the grace period passes, so the
+  late reply can never resolve a newer command's future.
+  """
+
+  def __init__(self, min_id, max_id, grace_period=QUARANTINE_PERIOD):
+    self._free = deque(range(min_id, max_id + 1))
+    self._pending = {}
+    self._quarantined = {}
+    self._waiters = deque()
+    self._grace_period = grace_period
+
+  @property
+  def in_flight(self):
+    return len(self._pending)
+
+  @property
+  def quarantined(self):
+    return len(self._quarantined)
+
+  async def acquire(self, future):
+    """Reserve a free id for the command that `future` waits on."""
+    while not self._free:
+      waiter = asyncio.get_running_loop().create_future()
+      self._waiters.append(waiter)
+      try:
+        await waiter
+      except asyncio.CancelledError:
+        if waiter.done() and not waiter.cancelled():
+          # pass the wake-up on to the next waiter
+          self._wake()
+        raise
+
+    cmd_id = self._free.popleft()
+    self._pending[cmd_id] = future
+    return cmd_id
+
+  def resolve(self, cmd_id):
+    """Release the id of a reply, and return the future waiting on it, if any."""
+    handle = self._quarantined.pop(cmd_id, None)
+    if handle:
+      handle.cancel()
+      self._release(cmd_id)
+      return None
+
+    future = self._pending.pop(cmd_id, None)
+    if future is not None:
+      self._release(cmd_id)
+    return future
+
+  def resolve_oldest(self):
+    """Take the oldest pending id, and return its future.
+
+    Error replies carry no command id, but the panel answers in order, so the
+    error is taken to be the reply to the oldest pending command. If that is
+    wrong, the command's own reply is still on its way, so its id is
+    quarantined rather than handed out again.
+    """
+    if not self._pending:
+      return None
+    cmd_id = next(iter(self._pending))
+    future = self._pending.pop(cmd_id)
+    self._hold(cmd_id)
+    return future
+
+  def quarantine(self, cmd_id, future):
+    """Hold the id of a command that is no longer awaited."""
+    if self._pending.get(cmd_id) is not future:
+      # already released by its reply, and maybe handed out again
+      return
+    del self._pending[cmd_id]
+    self._hold(cmd_id)
+
+  def clear(self, error=None):
+    """Drop quarantined ids, and fail the commands still pending with `error`, if given."""
+    for handle in self._quarantined.values():
+      handle.cancel()
+    self._quarantined.clear()
+    if error is not None:
+      for future in self._pending.values():
+        if future is not None and not future.done():
+          future.set_exception(error)
+
+  def _hold(self, cmd_id):
+    loop = asyncio.get_running_loop()
+    self._quarantined[cmd_id] = loop.call_later(self._grace_period, self._expire, cmd_id)
+
+  def _expire(self, cmd_id):
+    if self._quarantined.pop(cmd_id, None):
+      self._release(cmd_id)
+
+  def _release(self, cmd_id):
+    self._free.append(cmd_id)
+    self._wake()
+
+  def _wake(self):
+    while self._waiters:
+      waiter = self._waiters.popleft()
+      if not waiter.done():
+        waiter.set_result(None)
+        break
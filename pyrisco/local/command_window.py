@@ -0,0 +1,142 @@
+import asyncio
+import time
+from collections import deque
+from .const import PRIORITIES, PRIORITY_CONTROL, PRIORITY_INTERACTIVE
+
+STARVATION_TIMEOUT = 2
+RTT_SMOOTHING = 0.125
+RTT_TOLERANCE = 1.5
+DECREASE_FACTOR = 0.5
+
+
+class CommandWindow:
+  """Limits how many commands are in flight at once.
+
+  Free slots go to waiting commands in strict priority order. A command which
+  has waited longer than STARVATION_TIMEOUT competes one class higher, oldest
+  first, but never ahead of a control command.
+  """
+
+  def __init__(self, size):
+    self._size = size
+    self._in_flight = 0
+    self._waiters = {p: deque() for p in PRIORITIES}
+    self._queue_wait = {p: {'count': 0, 'total': 0, 'max': 0} for p in PRIORITIES}
+    self._rtt = None
+
+  @property
+  def size(self):
+    """Number of commands allowed in flight."""
+    return int(self._size)
+
+  @property
+  def in_flight(self):
+    return self._in_flight
+
+  @property
+  def rtt(self):
+    """Smoothed round trip time of successful commands, in seconds."""
+    return self._rtt
+
+  @property
+  def queue_wait(self):
+    """Number of commands, total and max seconds spent waiting for a slot, per priority."""
+    return {p: dict(stats) for p, stats in self._queue_wait.items()}
+
+  async def acquire(self, priority=PRIORITY_INTERACTIVE):
+    start = time.monotonic()
+    if self._in_flight < self.size and not any(self._waiters.values()):
+      self._in_flight += 1
+    else:
+      waiter = asyncio.get_running_loop().create_future()
+      self._waiters[priority].append((waiter, start))
+      try:
+        await waiter
+      except asyncio.CancelledError:
+        if waiter.done() and not waiter.cancelled():
+          # the slot was already handed over to us
+          self._in_flight -= 1
+          self._wake()
+        raise
+    self._record_wait(priority, time.monotonic() - start)
+
+  def release(self, rtt, error=False):
+    """Free a slot, reporting how long the command took and whether it failed."""
+    self._in_flight -= 1
+    if not error:
+      self._rtt = rtt if self._rtt is None else self._rtt + RTT_SMOOTHING * (rtt - self._rtt)
+    self._wake()
+
+  def _wake(self):
+    while self._in_flight < self.size:
+      waiter = self._next_waiter()
+      if not waiter:
+        break
+      if not waiter.done():
+        self._in_flight += 1
+        waiter.set_result(None)
+
+  def _next_waiter(self):
+    starved = time.monotonic() - STARVATION_TIMEOUT
+    best = None
+    for p in PRIORITIES:
+      queue = self._waiters[p]
+      if not queue:
+        continue
+      start = queue[0][1]
+      rank = p
+      if start < starved and p > PRIORITY_INTERACTIVE:
+        rank = p - 1
+      if best is None or (rank, start) < best[:2]:
+        best = (rank, start, queue)
+      if p == PRIORITY_CONTROL:
+        # nothing outranks a control command
+        break
+    if best is None:
+      return None
+    return best[2].popleft()[0]
+
+  def _record_wait(self, priority, wait):
+    stats = self._queue_wait[priority]
+    stats['count'] += 1
+    stats['total'] += wait
+    stats['max'] = max(stats['max'], wait)
+
+
+class AdaptiveCommandWindow(CommandWindow):
+  """A command window that sizes itself with AIMD.
+
+  The window grows by one command per round trip while round trip times stay
+  close to the best seen. It halves on errors, timeouts or rising round trip
+  times, at most once per round trip.
+  """
+
+  def __init__(self, size, min_size, max_size):
+    super().__init__(size)
+    self._min_size = min_size
+    self._max_size = max_size
+    self._min_rtt = None
+    self._last_decrease = 0
+
+  @property
+  def min_rtt(self):
+    return self._min_rtt
+
+  def release(self, rtt, error=False):
+    if error:
+      self._decrease()
+    else:
+      if self._min_rtt is None or rtt < self._min_rtt:
+        self._min_rtt = rtt
+      if rtt > self._min_rtt * RTT_TOLERANCE and (self._rtt or 0) > self._min_rtt * RTT_TOLERANCE:
+        self._decrease()
+      else:
+        self._size = min(self._max_size, self._size + 1 / self._size)
+    super().release(rtt, error)
+
+  def _decrease(self):
+    now = time.monotonic()
+    if self._rtt is not None and now - self._last_decrease < self._rtt:
+      return
+    self._last_decrease = now
+    self._size = max(self._min_size, self._size * DECREASE_FACTOR)
@@ -3,4 +3,9 @@ PANEL_MODEL = "panel_mode"
 PANEL_FW = "panel_firmware"
 MAX_ZONES = "max_zones"
 MAX_PARTS = "max_partitions"
-MAX_OUTPUTS = "max_outputs"
\ No newline at end of file
+MAX_OUTPUTS = "max_outputs"
+PRIORITY_CONTROL = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BULK = 2
+PRIORITY_KEEPALIVE = 3
+PRIORITIES = [PRIORITY_CONTROL, PRIORITY_INTERACTIVE, PRIORITY_BULK, PRIORITY_KEEPALIVE]
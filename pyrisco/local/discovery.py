@@ -0,0 +1,71 @@
+import asyncio
+from .const import PRIORITY_BULK
+from pyrisco.common import OperationError
+
+
+class ZoneDiscovery:
+  """Enumerates zones in stages, so each stage only queries zones that survived the last.
+
+  1. ZTYPE for every possible zone id
+  2. ZLNKTYP and ZSTT for zones with a type
+  3. Labels, partitions and groups for zones that are connected
+
+  All the commands of a stage are issued at once, to keep the socket's command
+  window full. With queue_status=True the ZSTT replies are also put on the
+  socket's queue, in order with the status pushes.
+  """
+
+  def __init__(self, rs, legacy_panel, create_zone, priority=PRIORITY_BULK, queue_status=False):
+    self._rs = rs
+    self._legacy_panel = legacy_panel
+    self._create_zone = create_zone
+    self._priority = priority
+    self._queue_status = queue_status
+    self.commands = 0
+
+  async def run(self, zone_ids, on_zone=None):
+    """Discover the zones among `zone_ids`, calling `on_zone` as each one completes."""
+    types = await self._stage([f'ZTYPE*{i}?' for i in zone_ids])
+    typed = [(i, int(t)) for i, t in zip(zone_ids, types) if t is not None]
+    typed = [(i, t) for i, t in typed if t != 0]
+
+    ids = [i for i, t in typed]
+    statuses = self._stage([f'ZSTT*{i}?' for i in ids], self._queue_status)
+    if self._legacy_panel:
+      techs = [''] * len(ids)
+      statuses = await statuses
+    else:
+      techs, statuses = await asyncio.gather(self._stage([f'ZLNKTYP{i}?' for i in ids]), statuses)
+
+    connected = [
+      (i, t, tech, status) for (i, t), tech, status in zip(typed, techs, statuses)
+      if tech is not None and tech.strip() != 'N' and status is not None and not status.endswith('N')
+    ]
+    zones = await asyncio.gather(*[self._complete(*z, on_zone) for z in connected])
+    return [z for z in zones if z]
+
+  async def _complete(self, zone_id, zone_type, tech, status, on_zone):
+    commands = [f'ZLBL*{zone_id}?', f'ZPART&*{zone_id}?']
+    if not self._legacy_panel:
+      commands.append(f'ZAREA&*{zone_id}?')
+    results = await self._stage(commands)
+    if None in results:
+      return None
+    label, partitions, *groups = results
+    zone = self._create_zone(zone_id, status, zone_type, label, partitions, groups[0] if groups else '0', tech)
+    if on_zone:
+      on_zone(zone)
+    return zone
+
+  async def _stage(self, commands, queue_reply=False):
+    self.commands += len(commands)
+    return await asyncio.gather(*[self._query(c, queue_reply) for c in commands])
+
+  async def _query(self, command, queue_reply):
+    try:
+      if queue_reply:
+        reply = await self._rs.send_command(command, priority=self._priority, queue_reply=True)
+        return reply.split('=')[1]
+      return await self._rs.send_result_command(command, self._priority)
+    except OperationError:
+      return None
@@ -0,0 +1,190 @@
+import asyncio
+import time
+from collections import deque
+
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 1000
+SLOW_HANDLER_THRESHOLD = 1
+CLOSE_TIMEOUT = 5
+LAG_SMOOTHING = 0.125
+BATCH_KEY = 'batch'
+
+
+class HandlerDispatcher:
+  """Runs handlers on a fixed set of worker tasks.
+
+  Calls for the same key, e.g. the same zone, always go to the same worker, so
+  they run in the order they were dispatched. Each worker has a bounded queue.
+  When it is full, the call is kept and `wait_for_room()` holds back the
+  producer. The drop policies instead coalesce the call with one already queued
+  for the same key, dropping the oldest or the newest of the two; calls for
+  other keys are never dropped.
+
+  Batch handlers also get every call dispatched in the same loop iteration, as
+  one list of (key, params) tuples.
+  """
+
+  def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, overflow=OVERFLOW_BLOCK, on_error=None):
+    self._queues = [deque() for i in range(workers)]
+    self._wakeups = [None] * workers
+    self._queue_size = queue_size
+    self._overflow = overflow
+    self._on_error = on_error
+    self._tasks = None
+    self._room = None
+    self._idle = None
+    self._pending = 0
+    self._queued_keys = {}
+    self._batch_handlers = []
+    self._batch = None
+    self._dropped = 0
+    self._dispatched = 0
+    self._lag = 0
+    self._max_lag = 0
+    self._slow_handlers = {}
+
+  @property
+  def stats(self):
+    """Calls dispatched, dropped and pending, dispatch lag and slow handler counts."""
+    return {
+      'dispatched': self._dispatched,
+      'dropped': self._dropped,
+      'pending': self._pending,
+      'lag': self._lag,
+      'max_lag': self._max_lag,
+      'slow_handlers': dict(self._slow_handlers),
+    }
+
+  def add_batch_handler(self, handler):
+    self._batch_handlers.append(handler)
+    def _remove():
+      self._batch_handlers.remove(handler)
+    return _remove
+
+  def dispatch(self, key, handlers, *params):
+    """Queue a call of `handlers` with `params`, in order with other calls for `key`."""
+    if self._batch_handlers:
+      self._add_to_batch(key, params)
+    if handlers:
+      self._enqueue(key, list(handlers), params)
+
+  async def wait_for_room(self):
+    """Wait until every worker queue is below its size."""
+    while any(len(q) >= self._queue_size for q in self._queues):
+      if not self._room:
+        self._room = asyncio.get_running_loop().create_future()
+      await asyncio.shield(self._room)
+
+  async def join(self):
+    """Wait until every queued call has run."""
+    if self._pending and asyncio.current_task() not in (self._tasks or []):
+      if not self._idle:
+        self._idle = asyncio.get_running_loop().create_future()
+      await asyncio.shield(self._idle)
+
+  async def close(self, timeout=CLOSE_TIMEOUT):
+    """Run queued calls for up to `timeout` seconds, then stop the workers.
+
+    Calls still queued by then are dropped, and running ones are cancelled.
+    """
+    try:
+      await asyncio.wait_for(self.join(), timeout)
+    except asyncio.TimeoutError:
+      pass
+    tasks, self._tasks = self._tasks, None
+    current = asyncio.current_task()
+    for task in tasks or []:
+      if task is not current:
+        task.cancel()
+    for queue in self._queues:
+      self._dropped += len(queue)
+      self._pending -= len(queue)
+      queue.clear()
+    self._queued_keys.clear()
+    if self._room:
+      self._room.set_result(None)
+      self._room = None
+
+  def _add_to_batch(self, key, params):
+    if self._batch is None:
+      self._batch = []
+      asyncio.get_running_loop().call_soon(self._flush_batch)
+    self._batch.append((key, params))
+
+  def _flush_batch(self):
+    batch, self._batch = self._batch, None
+    if self._batch_handlers:
+      self._enqueue(BATCH_KEY, list(self._batch_handlers), (batch,))
+
+  def _enqueue(self, key, handlers, params):
+    if self._tasks is None:
+      self._tasks = [asyncio.create_task(self._work(i)) for i in range(len(self._queues))]
+    index = hash(key) % len(self._queues)
+    queue = self._queues[index]
+    if len(queue) >= self._queue_size and self._overflow != OVERFLOW_BLOCK and self._queued_keys.get(key):
+      if self._overflow == OVERFLOW_DROP_NEWEST:
+        self._dropped += 1
+        return
+      if self._overflow == OVERFLOW_DROP_OLDEST:
+        self._remove_oldest(queue, key)
+    queue.append((time.monotonic(), key, handlers, params))
+    self._queued_keys[key] = self._queued_keys.get(key, 0) + 1
+    self._pending += 1
+    self._dispatched += 1
+    wakeup = self._wakeups[index]
+    if wakeup and not wakeup.done():
+      wakeup.set_result(None)
+
+  def _remove_oldest(self, queue, key):
+    for i, entry in enumerate(queue):
+      if entry[1] == key:
+        del queue[i]
+        break
+    self._unqueued(key)
+    self._dropped += 1
+    self._pending -= 1
+
+  def _unqueued(self, key):
+    count = self._queued_keys[key] - 1
+    if count:
+      self._queued_keys[key] = count
+    else:
+      del self._queued_keys[key]
+
+  async def _work(self, index):
+    queue = self._queues[index]
+    while True:
+      if not queue:
+        self._wakeups[index] = asyncio.get_running_loop().create_future()
+        await self._wakeups[index]
+        continue
+      queued_at, key, handlers, params = queue.popleft()
+      self._unqueued(key)
+      if self._room and len(queue) < self._queue_size:
+        self._room.set_result(None)
+        self._room = None
+      lag = time.monotonic() - queued_at
+      self._lag += LAG_SMOOTHING * (lag - self._lag)
+      self._max_lag = max(self._max_lag, lag)
+      try:
+        await asyncio.gather(*[self._run(key, h, params) for h in handlers])
+      finally:
+        self._pending -= 1
+        if not self._pending and self._idle:
+          self._idle.set_result(None)
+          self._idle = None
+
+  async def _run(self, key, handler, params):
+    start = time.monotonic()
+    try:
+      await handler(*params)
+    except Exception as error:
+      if self._on_error:
+        self._on_error(key, error)
+    finally:
+      if time.monotonic() - start > SLOW_HANDLER_THRESHOLD:
+        name = getattr(handler, '__qualname__', repr(handler))
+        self._slow_handlers[name] = self._slow_handlers.get(name, 0) + 1
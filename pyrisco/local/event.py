@@ -0,0 +1,157 @@
+import re
+from collections import deque
+from itertools import islice
+
+DEFAULT_EVENT_LOG_SIZE = 1000
+
+TIME_PATTERN = re.compile(r'\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\s+\d{1,2}:\d{2}(?::\d{2})?')
+ZONE_PATTERN = re.compile(r'\b(?:zone\s*|z)0*(\d+)\b', re.IGNORECASE)
+PARTITION_PATTERN = re.compile(r'\b(?:partition|part|prt)\s*0*(\d+)\b', re.IGNORECASE)
+USER_PATTERN = re.compile(r'\b(?:user\s*|u)0*(\d+)\b', re.IGNORECASE)
+
+# Checked in order, so more specific events come first, e.g. a tamper alarm is
+# a tamper. Keywords match at the start of a word: 'arm' matches 'Armed', but
+# not 'Alarm' or 'Disarm'.
+EVENT_KEYWORDS_TO_TYPES = [
+  ('unbypass', 'zone unbypassed'),
+  ('bypass', 'zone bypassed'),
+  ('tamper', 'tamper'),
+  ('fire', 'fire'),
+  ('alarm', 'alarm'),
+  ('disarm', 'disarmed'),
+  ('stay', 'partially armed'),
+  ('group arm', 'group arm'),
+  ('arm', 'armed'),
+  ('ac loss', 'power lost'),
+  ('ac restore', 'power restored'),
+  ('low batt', 'low battery'),
+  ('restore', 'restored'),
+  ('open', 'triggered'),
+  ('trigger', 'triggered'),
+]
+_EVENT_PATTERNS = [(re.compile(r'\b' + re.escape(keyword), re.IGNORECASE), t) for keyword, t in EVENT_KEYWORDS_TO_TYPES]
+
+
+def _number(pattern, text):
+  match = pattern.search(text)
+  return int(match.group(1)) if match else None
+
+
+def parse_event(text):
+  """Parse the text of an EVENT= push into an `Event`.
+
+  The panel sends free text, so the time, type and source are picked out
+  heuristically; anything that isn't recognised is None, or 'unknown' for the
+  type.
+  """
+  match = TIME_PATTERN.search(text)
+  type_name = next((t for pattern, t in _EVENT_PATTERNS if pattern.search(text)), 'unknown')
+  return Event(
+    text,
+    match.group(0) if match else None,
+    type_name,
+    _number(ZONE_PATTERN, text),
+    _number(PARTITION_PATTERN, text),
+    _number(USER_PATTERN, text),
+  )
+
+
+class Event:
+  """A representation of a Risco event, from the local panel."""
+  __slots__ = ('_raw', '_time', '_type_name', '_zone_id', '_partition_id', '_user_id')
+
+  def __init__(self, raw, time, type_name, zone_id, partition_id, user_id):
+    self._raw = raw
+    self._time = time
+    self._type_name = type_name
+    self._zone_id = zone_id
+    self._partition_id = partition_id
+    self._user_id = user_id
+
+  @property
+  def raw(self):
+    """Event text, as sent by the panel."""
+    return self._raw
+
+  @property
+  def time(self):
+    """Time the event was fired, as sent by the panel."""
+    return self._time
+
+  @property
+  def type_name(self):
+    return self._type_name
+
+  @property
+  def zone_id(self):
+    return self._zone_id
+
+  @property
+  def partition_id(self):
+    return self._partition_id
+
+  @property
+  def user_id(self):
+    return self._user_id
+
+  def __repr__(self):
+    return f'Event({self._raw!r})'
+
+
+class EventLog:
+  """The most recent events, indexed by zone, partition and type.
+
+  Events are kept in a fixed-capacity ring. The event evicted from the ring
+  is always the oldest one in each of its indexes too, so adding an event
+  is O(1), and the last k events for a zone, partition or type are O(k).
+  """
+
+  def __init__(self, capacity=DEFAULT_EVENT_LOG_SIZE):
+    self._capacity = capacity
+    self._events = deque()
+    self._by_zone = {}
+    self._by_partition = {}
+    self._by_type = {}
+
+  def __len__(self):
+    return len(self._events)
+
+  def append(self, event):
+    if self._capacity <= 0:
+      return
+    if len(self._events) == self._capacity:
+      self._evict(self._events.popleft())
+    self._events.append(event)
+    for index, key in self._keys(event):
+      index.setdefault(key, deque()).append(event)
+
+  def events(self, count=None):
+    """The last `count` events (all by default), newest first."""
+    return _newest(self._events, count)
+
+  def for_zone(self, zone_id, count=None):
+    return _newest(self._by_zone.get(zone_id, ()), count)
+
+  def for_partition(self, partition_id, count=None):
+    return _newest(self._by_partition.get(partition_id, ()), count)
+
+  def for_type(self, type_name, count=None):
+    return _newest(self._by_type.get(type_name, ()), count)
+
+  def _keys(self, event):
+    if event.zone_id is not None:
+      yield self._by_zone, event.zone_id
+    if event.partition_id is not None:
+      yield self._by_partition, event.partition_id
+    yield self._by_type, event.type_name
+
+  def _evict(self, event):
+    for index, key in self._keys(event):
+      events = index[key]
+      events.popleft()
+      if not events:
+        del index[key]
+
+
+def _newest(events, count):
+  return list(islice(reversed(events), count))
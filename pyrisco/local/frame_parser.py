@@ -0,0 +1,78 @@
+import re
+from .risco_crypt import START, END, DLE
+
+_START_BYTE = START[0]
+_END_BYTE = END[0]
+_DLE_BYTE = DLE[0]
+_SPECIAL_PATTERN = re.compile(b'[\x02\x03\x10]')
+
+
+class FrameParser:
+  """Incremental parser that splits a panel byte stream into frames.
+
+  Frames are returned escaped and including their STX/ETX markers, ready for
+  RiscoCrypt.decode. Bytes are scanned once, no matter how the stream is split.
+  """
+
+  def __init__(self):
+    self._buffer = bytearray()
+    self._position = 0
+    self._start = -1
+
+  def feed(self, data):
+    """Add received bytes, and return the list of frames they complete."""
+    buffer = self._buffer
+    buffer += data
+    length = len(buffer)
+    position = self._position
+    start = self._start
+    frames = []
+
+    while position < length:
+      if start < 0:
+        start = buffer.find(START, position)
+        if start < 0:
+          position = length
+          break
+        position = start + 1
+        continue
+
+      match = _SPECIAL_PATTERN.search(buffer, position)
+      if not match:
+        position = length
+        break
+
+      index = match.start()
+      byte = buffer[index]
+      if byte == _DLE_BYTE:
+        if index + 1 == length:
+          # wait for the escaped byte
+          position = index
+          break
+        position = index + 2
+      elif byte == _END_BYTE:
+        frames.append(bytes(buffer[start:index+1]))
+        start = -1
+        position = index + 1
+      else:
+        # An unescaped STX means the previous frame was cut off, resync on the new one
+        start = index
+        position = index + 1
+
+    if start < 0:
+      del buffer[:position]
+      position = 0
+    else:
+      del buffer[:start]
+      position -= start
+      start = 0
+
+    self._position = position
+    self._start = start
+    return frames
+
+  def reset(self):
+    """Discard any partially received frame."""
+    self._buffer.clear()
+    self._position = 0
+    self._start = -1
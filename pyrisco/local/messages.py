@@ -0,0 +1,55 @@
+DIGITS = '0123456789'
+
+
+class Message:
+  """A message pushed by the panel, parsed once.
+
+  `ZSTT12=--O-` has the command `ZSTT12`, the prefix `ZSTT`, the entity id 12
+  and the value `--O-`. Messages without an entity, such as `SSTT=` or
+  `EVENT=`, have an entity id of None.
+  """
+  __slots__ = ('command', 'prefix', 'entity_id', 'value')
+
+  def __init__(self, command, prefix, entity_id, value):
+    self.command = command
+    self.prefix = prefix
+    self.entity_id = entity_id
+    self.value = value
+
+  @property
+  def fields(self):
+    """The value split into its '=' separated fields."""
+    return self.value.split('=')
+
+  def __repr__(self):
+    return f'Message({self.command}={self.value})'
+
+
+def parse_message(item):
+  command, _, value = item.partition('=')
+  prefix = command.rstrip(DIGITS)
+  entity_id = int(command[len(prefix):]) if len(prefix) < len(command) else None
+  return Message(command, prefix, entity_id, value)
+
+
+class MessageRouter:
+  """Routes messages to a handler by prefix, with a single lookup per message."""
+
+  def __init__(self, default):
+    self._routes = {}
+    self._default = default
+
+  def __contains__(self, prefix):
+    return prefix in self._routes
+
+  def add_route(self, prefix, route):
+    if prefix in self._routes:
+      raise ValueError(f'A route for {prefix} already exists')
+    self._routes[prefix] = route
+    def _remove():
+      del self._routes[prefix]
+    return _remove
+
+  def route(self, item):
+    message = parse_message(item)
+    self._routes.get(message.prefix, self._default)(message)
@@ -0,0 +1,54 @@
+import asyncio
+import json
+import os
+
+CACHE_VERSION = 1
+
+
+class PanelCache:
+  """Keeps panel metadata (labels, zone types and membership) on disk.
+
+  There is one file per panel serial. An entry is only used when the panel
+  type and firmware still match the ones it was saved with.
+  """
+
+  def __init__(self, directory):
+    self._directory = directory
+
+  async def load(self, key):
+    """Return the cached metadata for `key`, or None."""
+    return await asyncio.to_thread(self._load, key)
+
+  async def save(self, key, data):
+    await asyncio.to_thread(self._save, key, data)
+
+  async def invalidate(self, key):
+    await asyncio.to_thread(self._remove, key)
+
+  def _path(self, key):
+    serial = ''.join(c for c in key['serial'] if c.isalnum())
+    return os.path.join(self._directory, f'{serial}.json')
+
+  def _load(self, key):
+    try:
+      with open(self._path(key), encoding='utf-8') as f:
+        cached = json.load(f)
+    except (OSError, ValueError):
+      return None
+    if cached.get('version') != CACHE_VERSION or cached.get('key') != key:
+      return None
+    return cached['data']
+
+  def _save(self, key, data):
+    os.makedirs(self._directory, exist_ok=True)
+    path = self._path(key)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+      json.dump({'version': CACHE_VERSION, 'key': key, 'data': data}, f)
+    os.replace(temp_path, path)
+
+  def _remove(self, key):
+    try:
+      os.remove(self._path(key))
+    except FileNotFoundError:
+      pass
@@ -1,12 +1,25 @@
 from pyrisco.common import GROUP_ID_TO_NAME, Partition as BasePartition
+from .status_flags import parse_flags
+
+ARMED = 1
+PARTIALLY_ARMED = 2
+TRIGGERED = 4
+READY = 8
+GROUP_ARMED = (16, 32, 64, 128)
+STATUS_FLAGS = {'A': ARMED, 'H': PARTIALLY_ARMED, 'a': TRIGGERED, 'R': READY,
+                **{str(g+1): GROUP_ARMED[g] for g in range(0,4)}}
+
 
 class Partition(BasePartition):
+  __slots__ = ('_panel', '_id', '_status', '_flags', '_name')
+
   def __init__(self, panel, partition_id, label, status):
       """Read partition from response."""
       self._panel = panel
       self._id = partition_id
-      self._status = status
       self._name = label.strip()
+      self._status = status
+      self._flags = parse_flags(status, STATUS_FLAGS)
 
   async def disarm(self):
     """Disarm the partition."""
@@ -37,27 +50,27 @@ class Partition(BasePartition):
   @property
   def disarmed(self):
       """Is the partition disarmed."""
-      return not (self.armed or self.partially_armed)
+      return not self._flags & (ARMED | PARTIALLY_ARMED)
 
   @property
   def partially_armed(self):
       """Is the partition partially-armed."""
-      return 'H' in self._status
+      return bool(self._flags & PARTIALLY_ARMED)
 
   @property
   def armed(self):
       """Is the partition armed."""
-      return 'A' in self._status
+      return bool(self._flags & ARMED)
 
   @property
   def triggered(self):
       """Is the partition triggered."""
-      return 'a' in self._status
+      return bool(self._flags & TRIGGERED)
 
   @property
   def ready(self):
       """Is the partition ready."""
-      return 'R' in self._status
+      return bool(self._flags & READY)
 
   @property
   def arming(self):
@@ -68,7 +81,18 @@ class Partition(BasePartition):
   @property
   def groups(self):
       """Group arming status."""
-      return {GROUP_ID_TO_NAME[g]: (str(g+1) in self._status) for g in range(0,4)}
+      return {GROUP_ID_TO_NAME[g]: bool(self._flags & GROUP_ARMED[g]) for g in range(0,4)}
 
   def update_status(self, status):
+    """Update the status, and return a mask of the flags that changed.
+
+    Returns None if the status is unchanged, and 0 if it changed without any
+    known flag changing.
+    """
+    if status == self._status:
+      return None
     self._status = status
+    flags = parse_flags(status, STATUS_FLAGS)
+    changed = flags ^ self._flags
+    self._flags = flags
+    return changed
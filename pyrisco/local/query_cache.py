@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+# Queries whose replies only change when the panel is reconfigured
+CACHED_QUERIES = ('PNLCNF', 'PNLSERD', 'FSVER?', 'SYSLBL?', 'PLBL', 'ZLBL*', 'ZTYPE*', 'ZLNKTYP', 'ZPART&*', 'ZAREA&*')
+
+
+def _name(query):
+  return query[:-1] if query.endswith('?') else query
+
+
+class QueryCache:
+  """Shares and caches the replies to read-only queries.
+
+  Concurrent requests for the same query share a single command, and replies
+  are kept for `ttl` seconds. A command that writes a value (e.g. `ZLBL*3=...`)
+  drops the cached reply to its query, as does `clear()`.
+  """
+
+  def __init__(self, queries=CACHED_QUERIES, ttl=0):
+    self._queries = tuple(queries)
+    self._ttl = ttl
+    self._values = {}
+    self._in_flight = {}
+    self._generation = 0
+    self.hits = 0
+    self.shared = 0
+    self.misses = 0
+
+  def cacheable(self, query):
+    return query.startswith(self._queries)
+
+  async def get(self, query, fetch):
+    """The reply to `query`, from the cache, a request in flight, or by awaiting `fetch()`."""
+    entry = self._values.get(query)
+    if entry:
+      if entry[0] > time.monotonic():
+        self.hits += 1
+        return entry[1]
+      del self._values[query]
+
+    task = self._in_flight.get(query)
+    if task is None:
+      self.misses += 1
+      task = asyncio.create_task(self._fetch(query, fetch))
+      # don't warn about an error nobody waits for any more
+      task.add_done_callback(lambda t: t.cancelled() or t.exception())
+      self._in_flight[query] = task
+    else:
+      self.shared += 1
+    # one caller giving up mustn't cancel the request for the others
+    return await asyncio.shield(task)
+
+  async def _fetch(self, query, fetch):
+    generation = self._generation
+    try:
+      value = await fetch()
+    finally:
+      if self._in_flight.get(query) is asyncio.current_task():
+        del self._in_flight[query]
+    if self._ttl > 0 and generation == self._generation:
+      # not invalidated while the reply was on its way
+      self._values[query] = (time.monotonic() + self._ttl, value)
+    return value
+
+  def invalidate(self, command):
+    """Drop the cached reply that `command`, a write, may have changed."""
+    name = _name(command.partition('=')[0])
+    self._generation += 1
+    for query in (name + '?', name):
+      self._values.pop(query, None)
+      # later requests must not share a reply that may predate the write
+      self._in_flight.pop(query, None)
+
+  def clear(self):
+    self._generation += 1
+    self._values.clear()
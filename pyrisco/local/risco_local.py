@@ -1,74 +1,262 @@
 import asyncio
-import copy
+import random
+import time
 from .const import PANEL_TYPE, PANEL_MODEL, PANEL_FW, MAX_ZONES, MAX_PARTS, MAX_OUTPUTS
+from .const import PRIORITY_CONTROL, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from .discovery import ZoneDiscovery
+from .event import EventLog, parse_event, DEFAULT_EVENT_LOG_SIZE
+from .dispatcher import HandlerDispatcher, DEFAULT_WORKERS, DEFAULT_QUEUE_SIZE, OVERFLOW_BLOCK
+from .messages import MessageRouter
+from .panel_cache import PanelCache
 from .panels import panel_capabilities
 from .partition import Partition
 from .zone import Zone
 from .system import System
 from .risco_socket import RiscoSocket
+from .subscriptions import Subscriptions
+from .state_store import StateStore, ZONE, PARTITION, SYSTEM
 from pyrisco.common import OperationError, GROUP_ID_TO_NAME
 
+ZONE_DIMENSIONS = ('zone_ids', 'partitions', 'groups')
+PARTITION_DIMENSIONS = ('partition_ids',)
+RECONNECT_INITIAL_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+CONFIRM_TIMEOUT = 10
+# Long enough for the exit delay, as some panels only report a partition armed once it ends
+ARM_CONFIRM_TIMEOUT = 120
+# arm_partitions() modes: the command, and how the partition looks once it took effect
+ARM_MODES = {
+  'arm': ('ARM', lambda p: p.armed),
+  'partial_arm': ('STAY', lambda p: p.partially_armed),
+  'disarm': ('DISARM', lambda p: p.disarmed),
+}
+
 
 class RiscoLocal:
   def __init__(self, host, port, code, **kwargs):
     self._rs = RiscoSocket(host, port, code, **kwargs)
+    cache_dir = kwargs.get('cache_dir')
+    self._cache = PanelCache(cache_dir) if cache_dir else None
+    self._cache_key = None
+    self._cache_tasks = set()
+    self._cache_check_task = None
+    self._overflow = kwargs.get('handler_overflow', OVERFLOW_BLOCK)
+    self._dispatcher = HandlerDispatcher(
+      kwargs.get('handler_workers', DEFAULT_WORKERS),
+      kwargs.get('handler_queue_size', DEFAULT_QUEUE_SIZE),
+      self._overflow,
+      self._handler_error,
+    )
+    self._auto_reconnect = kwargs.get('auto_reconnect', False)
+    self._reconnect_initial_delay = kwargs.get('reconnect_initial_delay', RECONNECT_INITIAL_DELAY)
+    self._reconnect_max_delay = kwargs.get('reconnect_max_delay', RECONNECT_MAX_DELAY)
+    self._reconnecting = False
+    self._reconnects = 0
+    self._reconnect_attempts = 0
+    self._recovery_time = None
+    self._resume_discovery = False
+    self._confirmations = {}
+    self._arm_timeout = kwargs.get('arm_timeout', ARM_CONFIRM_TIMEOUT)
+    self._store = StateStore()
+    self._delivered = 0
+    self._suppressed = 0
     self._panel_capabilities = None
     self._listen_task = None
+    self._discovery_task = None
+    self._zone_waiter = None
+    self._undiscovered_zone_status = {}
+    self._awaiting_zone_status = set()
     self._system_handlers = []
-    self._zone_handlers = []
-    self._partition_handlers = []
+    self._zone_handlers = Subscriptions(ZONE_DIMENSIONS)
+    self._zone_discovered_handlers = []
+    self._partition_handlers = Subscriptions(PARTITION_DIMENSIONS)
     self._error_handlers = []
     self._default_handlers = []
     self._event_handlers = []
+    self._parsed_event_handlers = []
+    self._events = EventLog(kwargs.get('event_log_size', DEFAULT_EVENT_LOG_SIZE))
+    self._message_handlers = {}
+    self._router = MessageRouter(self._default_message)
+    # safe to ignore these
+    self._router.add_route('CLOCK', lambda message: None)
+    self._router.add_route('EVENT', lambda message: self._event(message.value))
+    self._router.add_route('ZSTT', lambda message: self._zone_status(message.entity_id, message.value))
+    self._router.add_route('ZSTT*', lambda message: self._zone_status_reply(message.entity_id, message.value))
+    self._router.add_route('PSTT', lambda message: self._partition_status(message.entity_id, message.value))
+    self._router.add_route('SSTT', lambda message: self._system_status(message.value))
     self._system = None
     self._zones = None
     self._partitions = None
     self._id = None
     self._legacy_panel = False
 
-  async def connect(self):
+  async def connect(self, progressive=False):
+    """Connect to the panel and discover its zones, partitions and system.
+
+    With progressive=True, return as soon as partitions and the system are ready.
+    Zones are then added to `zones` as they are discovered, and announced to zone
+    discovered handlers and `discovered_zones()`.
+    """
     await self._rs.connect()
-    panel_type = await self._rs.send_result_command("PNLCNF")
+    panel_type, self._id = await asyncio.gather(
+      self._rs.send_result_command("PNLCNF", PRIORITY_INTERACTIVE),
+      self._rs.send_result_command("PNLSERD", PRIORITY_INTERACTIVE),
+    )
     self._legacy_panel = not panel_type.startswith("RP")
     if self._legacy_panel:
       firmware = ""
     else:
-      firmware = await self._rs.send_result_command("FSVER?")
+      firmware = await self._rs.send_result_command("FSVER?", PRIORITY_INTERACTIVE)
     self._panel_capabilities = panel_capabilities(panel_type, firmware)
-    self._id = await self._rs.send_result_command("PNLSERD")
-    self._zones = await self._init_zones()
-    self._partitions = await self._init_partitions()
-    self._system = await self._init_system()
+    self._cache_key = {'serial': self._id, 'type': panel_type, 'firmware': firmware}
+    if await self._init_from_cache():
+      self._store_system_and_partitions()
+      self._listen_task = asyncio.create_task(self._listen(self._rs.queue))
+      self._cache_check_task = asyncio.create_task(self._check_cache())
+      return
+
+    self._zones = {}
+    self._discovery_task = asyncio.create_task(self._discover_zones())
+    self._partitions, self._system = await asyncio.gather(self._init_partitions(), self._init_system())
+    self._store_system_and_partitions()
+    if progressive:
+      self._discovery_task.add_done_callback(self._discovery_done)
+    else:
+      await self._discovery_task
+      await self._save_cache()
     self._listen_task = asyncio.create_task(self._listen(self._rs.queue))
 
   async def disconnect(self):
+    if self._reconnecting and self._listen_task:
+      # stop reconnecting; the panel can't be told we are leaving
+      self._listen_task.cancel()
+      self._listen_task = None
+      await self._rs.close()
+    self._resume_discovery = False
+    if self._discovery_task:
+      self._discovery_task.cancel()
+      self._discovery_task = None
+    self._awaiting_zone_status.clear()
+    self._wake_zone_waiter()
+    self._cancel_cache_check()
+    if self._cache_tasks:
+      await asyncio.gather(*self._cache_tasks, return_exceptions=True)
     await self._rs.disconnect()
+    await self._dispatcher.close()
     if self._listen_task:
       self._listen_task.cancel()
       self._listen_task = None
 
+  async def wait_for_zones(self):
+    """Wait until zone discovery is complete."""
+    while self._discovering():
+      task = self._discovery_task
+      if task.done():
+        # interrupted by a lost connection, and resumed once reconnected
+        await self._wait_for_zone()
+        continue
+      try:
+        await asyncio.shield(task)
+      except asyncio.CancelledError:
+        if not task.cancelled():
+          raise
+
+  async def discovered_zones(self):
+    """Iterate over zones as they are discovered, starting with the ones already known."""
+    index = 0
+    while True:
+      zones = list(self._zones.values())
+      for zone in zones[index:]:
+        yield zone
+      index = len(zones)
+      if not self._discovering():
+        if index == len(self._zones):
+          return
+        continue
+      await self._wait_for_zone()
+
+  def add_zone_discovered_handler(self, handler):
+    return RiscoLocal._add_handler(self._zone_discovered_handlers, handler)
+
+  def add_batch_handler(self, handler):
+    """Add a handler called with a list of (key, params) for all handler calls made in one loop iteration."""
+    return self._dispatcher.add_batch_handler(handler)
+
+  @property
+  def dispatch_stats(self):
+    return self._dispatcher.stats
+
+  @property
+  def reconnect_stats(self):
+    """Reconnects so far, failed attempts, and the time from the last link loss to a reconciled state."""
+    return {
+      'reconnecting': self._reconnecting,
+      'reconnects': self._reconnects,
+      'failed_attempts': self._reconnect_attempts,
+      'recovery_time': self._recovery_time,
+    }
+
+  @property
+  def update_stats(self):
+    """Status pushes that changed an entity and were delivered, and repeats that were suppressed."""
+    return {'delivered': self._delivered, 'suppressed': self._suppressed}
+
   def add_error_handler(self, handler):
     return RiscoLocal._add_handler(self._error_handlers, handler)
 
-  def add_event_handler(self, handler):
+  def add_event_handler(self, handler, parsed=False):
+    """Add an event handler, called with the event text, or with an `Event` if `parsed` is True."""
+    if parsed:
+      return RiscoLocal._add_handler(self._parsed_event_handlers, handler)
     return RiscoLocal._add_handler(self._event_handlers, handler)
 
   def add_system_handler(self, handler):
     return RiscoLocal._add_handler(self._system_handlers, handler)
 
-  def add_zone_handler(self, handler):
-    return RiscoLocal._add_handler(self._zone_handlers, handler)
+  def add_zone_handler(self, handler, mask=None, zone_ids=None, partitions=None, groups=None):
+    """Add a zone handler, optionally only for some zones or for changes to some flags.
 
-  def add_partition_handler(self, handler):
-    return RiscoLocal._add_handler(self._partition_handlers, handler)
+    The handler is called for zones matching all of the given filters: one of
+    `zone_ids`, in one of `partitions`, in one of `groups` (names, e.g. 'A'),
+    and only when one of the zone flags in `mask` (e.g. `TRIGGERED | BYPASSED`
+    from `pyrisco.local.zone`) changed.
+    """
+    return self._zone_handlers.add(handler, mask, zone_ids=zone_ids, partitions=partitions, groups=groups)
+
+  def add_partition_handler(self, handler, partition_ids=None):
+    """Add a partition handler, optionally only for the partitions in `partition_ids`."""
+    return self._partition_handlers.add(handler, partition_ids=partition_ids)
 
   def add_default_handler(self, handler):
     return RiscoLocal._add_handler(self._default_handlers, handler)
 
+  def add_message_handler(self, prefix, handler):
+    """Add a handler for panel pushes starting with `prefix` (e.g. 'OSTT'), called with a `Message`.
+
+    Messages with a registered prefix are no longer passed to the default handlers.
+    """
+    handlers = self._message_handlers.get(prefix)
+    if handlers is None:
+      if prefix in self._router:
+        raise ValueError(f'{prefix} messages are handled by RiscoLocal')
+      handlers = self._message_handlers[prefix] = []
+      self._router.add_route(prefix, lambda message: self._call_handlers((prefix, message.entity_id), handlers, message))
+    return RiscoLocal._add_handler(handlers, handler)
+
   @property
   def id(self):
     return self._id
 
+  @property
+  def events(self):
+    """The `EventLog` of recent events, e.g. `events.for_zone(12, 10)` for the last 10 events of zone 12."""
+    return self._events
+
+  @property
+  def state(self):
+    """The versioned `StateStore`, for `snapshot()` and `changes_since(seq)`."""
+    return self._store
+
   @property
   def zones(self):
     return self._zones
@@ -83,32 +271,87 @@ class RiscoLocal:
 
   async def disarm(self, partition_id):
     """Disarm a partition."""
-    return await self._rs.send_ack_command(f'DISARM={partition_id}')
+    return await self._rs.send_ack_command(f'DISARM={partition_id}', PRIORITY_CONTROL)
 
   async def arm(self, partition_id):
     """Arm a partition."""
-    return await self._rs.send_ack_command(f'ARM={partition_id}')
+    return await self._rs.send_ack_command(f'ARM={partition_id}', PRIORITY_CONTROL)
 
   async def partial_arm(self, partition_id):
     """Partially-arm a partition."""
-    return await self._rs.send_ack_command(f'STAY={partition_id}')
+    return await self._rs.send_ack_command(f'STAY={partition_id}', PRIORITY_CONTROL)
 
   async def group_arm(self, partition_id, group):
     """Arm a specific group on a partition."""
     if isinstance(group, str):
         group = GROUP_ID_TO_NAME.index(group) + 1
 
-    return await self._rs.send_ack_command(f'GARM*{group}={partition_id}')
+    return await self._rs.send_ack_command(f'GARM*{group}={partition_id}', PRIORITY_CONTROL)
 
   async def bypass_zone(self, zone_id, bypass):
     """Bypass or unbypass a zone."""
     if self.zones[zone_id].bypassed != bypass:
-      await self._rs.send_ack_command(F'ZBYPAS={zone_id}')
+      await self._rs.send_ack_command(F'ZBYPAS={zone_id}', PRIORITY_CONTROL)
+
+  async def bypass_zones(self, zones, timeout=CONFIRM_TIMEOUT):
+    """Bypass or unbypass several zones at once, given as {zone_id: bypass}.
+
+    The commands are sent together, and each zone counts as done once the
+    panel reports it in the requested state. Returns {zone_id: success}.
+    """
+    async def _read(zone_id):
+      try:
+        return await self._rs.send_result_command(f'ZSTT*{zone_id}?', PRIORITY_CONTROL)
+      except OperationError:
+        return None
+
+    async def _bypass(zone_id, bypass, status):
+      zone = self._zones[zone_id]
+      if status is None:
+        return False
+      # ZBYPAS toggles, so decide from the live status, not from what we last heard
+      self._zone_status(zone_id, status)
+      try:
+        if zone.bypassed != bypass and not await self._rs.send_ack_command(f'ZBYPAS={zone_id}', PRIORITY_CONTROL):
+          return False
+      except OperationError:
+        return False
+      return await self._confirm(ZONE, zone_id, zone, lambda z: z.bypassed == bypass, timeout)
+
+    statuses = await asyncio.gather(*[_read(zone_id) for zone_id in zones])
+    results = await asyncio.gather(*[_bypass(zone_id, bypass, status) for (zone_id, bypass), status in zip(zones.items(), statuses)])
+    return dict(zip(zones, results))
+
+  async def arm_partitions(self, partition_ids, mode='arm', timeout=None):
+    """Arm, partially-arm or disarm several partitions at once.
+
+    `mode` is one of 'arm', 'partial_arm' or 'disarm'. The commands are sent
+    together, and each partition counts as done once the panel reports it in
+    the requested state, within `timeout` seconds (`arm_timeout` by default).
+    Returns {partition_id: success}.
+    """
+    if mode not in ARM_MODES:
+      raise ValueError(f'Unknown arming mode: {mode}')
+    command, armed = ARM_MODES[mode]
+    if timeout is None:
+      timeout = self._arm_timeout
+
+    async def _arm(partition_id):
+      partition = self._partitions[partition_id]
+      try:
+        if not await self._rs.send_ack_command(f'{command}={partition_id}', PRIORITY_CONTROL):
+          return False
+      except OperationError:
+        return False
+      return await self._confirm(PARTITION, partition_id, partition, armed, timeout)
+
+    results = await asyncio.gather(*[_arm(partition_id) for partition_id in partition_ids])
+    return dict(zip(partition_ids, results))
 
   async def set_time(self, time):
     """Set the time of the panel."""
     formatted_time = time.strftime('%d/%m/%Y %H:%M')
-    await self._rs.send_ack_command(F'CLOCK={formatted_time}')
+    await self._rs.send_ack_command(F'CLOCK={formatted_time}', PRIORITY_CONTROL)
 
   def _add_handler(handlers, handler):
     handlers.append(handler)
@@ -116,10 +359,104 @@ class RiscoLocal:
       handlers.remove(handler)
     return _remove
 
+  async def _init_from_cache(self):
+    """Restore zones, partitions and the system from the cache, fetching only their status."""
+    if not self._cache:
+      return False
+    cached = await self._cache.load(self._cache_key)
+    if not cached:
+      return False
+
+    system, partitions, zones = await asyncio.gather(
+      self._restore_system(cached['system']),
+      asyncio.gather(*[self._restore_partition(int(i), p) for i, p in cached['partitions'].items()]),
+      asyncio.gather(*[self._restore_zone(int(i), z) for i, z in cached['zones'].items()]),
+    )
+    if system is False or None in partitions or None in zones or (system and system.programming_mode):
+      # The configuration changed, or may be changing, since the cache was saved
+      await self._cache.invalidate(self._cache_key)
+      return False
+
+    self._system = system
+    self._partitions = { p.id: p for p in partitions }
+    self._zones = { z.id: z for z in zones }
+    for z in zones:
+      self._store.update(ZONE, z.id, z)
+    return True
+
+  async def _restore_system(self, cached):
+    if cached is None:
+      return None
+    try:
+      status = await self._rs.send_result_command(f'SSTT?', PRIORITY_BULK)
+    except OperationError:
+      return False
+    return System(self, cached['label'], status)
+
+  async def _restore_partition(self, partition_id, cached):
+    try:
+      status = await self._rs.send_result_command(f'PSTT{partition_id}?', PRIORITY_BULK)
+    except OperationError:
+      return None
+    if not 'E' in status:
+      return None
+    return Partition(self, partition_id, cached['label'], status)
+
+  async def _restore_zone(self, zone_id, cached):
+    try:
+      zone_type, status = await asyncio.gather(
+        self._rs.send_result_command(f'ZTYPE*{zone_id}?', PRIORITY_BULK),
+        self._rs.send_result_command(f'ZSTT*{zone_id}?', PRIORITY_BULK),
+      )
+    except OperationError:
+      return None
+    if status.endswith('N') or int(zone_type) != cached['type']:
+      return None
+    return Zone(self, zone_id, status, cached['type'], cached['label'], cached['partitions'], cached['groups'], cached['tech'])
+
+  async def _check_cache(self):
+    """Discover the zones again in the background, and refresh the cache if they changed.
+
+    Connecting from the cache only validates the cached zones, so this finds
+    zones that were added, and labels or membership that changed. New zones are
+    added right away; other changes apply from the next connect.
+    """
+    cached = await self._cache.load(self._cache_key)
+    discovery = ZoneDiscovery(self._rs, self._legacy_panel, lambda *args: Zone(self, *args))
+    zones = await discovery.run(range(1, self._panel_capabilities[MAX_ZONES] + 1))
+    if cached is None:
+      # invalidated meanwhile
+      return
+    zones = { z.id: z for z in zones }
+    if _zones_data(zones) == cached['zones']:
+      return
+    for zone_id, zone in zones.items():
+      if zone_id not in self._zones:
+        self._zone_discovered(zone, queued=False)
+    await self._save_cache(zones)
+
+  def _cancel_cache_check(self):
+    if self._cache_check_task:
+      self._cache_check_task.cancel()
+      self._cache_check_task = None
+
+  async def _save_cache(self, zones=None):
+    if not self._cache:
+      return
+    data = {
+      'system': { 'label': self._system.name } if self._system else None,
+      'partitions': { str(p.id): { 'label': p.name } for p in self._partitions.values() },
+      'zones': _zones_data(self._zones if zones is None else zones),
+    }
+    try:
+      await self._cache.save(self._cache_key, data)
+    except OSError as error:
+      self._error(error)
+
   async def _init_system(self):
     try:
-      label = await self._rs.send_result_command(f'SYSLBL?')
-      status = await self._rs.send_result_command(f'SSTT?')
+      label = await self._rs.send_result_command(f'SYSLBL?', PRIORITY_BULK)
+      status = await self._rs.send_result_command(f'SSTT?', PRIORITY_BULK)
     except OperationError:
       return None
     return System(self, label, status)
@@ -127,8 +464,55 @@ class RiscoLocal:
   async def _init_partitions(self):
     return await self._get_objects(1, self._panel_capabilities[MAX_PARTS], self._create_partition)
 
-  async def _init_zones(self):
-    return await self._get_objects(1, self._panel_capabilities[MAX_ZONES], self._create_zone)
+  async def _discover_zones(self, zone_ids=None):
+    if zone_ids is None:
+      zone_ids = range(1, self._panel_capabilities[MAX_ZONES] + 1)
+    discovery = ZoneDiscovery(self._rs, self._legacy_panel, lambda *args: Zone(self, *args), queue_status=True)
+    try:
+      await discovery.run(zone_ids, self._zone_discovered)
+    finally:
+      self._undiscovered_zone_status.clear()
+      self._wake_zone_waiter()
+
+  def _discovering(self):
+    return self._resume_discovery or (self._discovery_task is not None and not self._discovery_task.done())
+
+  def _discovery_done(self, task):
+    if task.cancelled():
+      return
+    if task.exception():
+      self._error(task.exception())
+    else:
+      self._cache_task(self._save_cache())
+
+  def _cache_task(self, coro):
+    # kept until done, so disconnect() can wait for it
+    task = asyncio.create_task(coro)
+    self._cache_tasks.add(task)
+    task.add_done_callback(self._cache_tasks.discard)
+
+  def _zone_discovered(self, zone, queued=True):
+    # With queued=True the status discovery read is also on its way through the
+    # listener, and pushes queued before it are older than the zone's status
+    status, replied = self._undiscovered_zone_status.pop(zone.id, (None, False))
+    if replied:
+      zone.update_status(status)
+    elif queued:
+      self._awaiting_zone_status.add(zone.id)
+    self._zones[zone.id] = zone
+    self._store.update(ZONE, zone.id, zone)
+    self._wake_zone_waiter()
+    self._call_handlers(('discovered', zone.id), self._zone_discovered_handlers, zone.id, zone)
+
+  async def _wait_for_zone(self):
+    if not self._zone_waiter:
+      self._zone_waiter = asyncio.get_running_loop().create_future()
+    await asyncio.shield(self._zone_waiter)
+
+  def _wake_zone_waiter(self):
+    if self._zone_waiter:
+      self._zone_waiter.set_result(None)
+      self._zone_waiter = None
 
   async def _get_objects(self, min, max, func):
     ids = range(min, min+max)
@@ -137,100 +521,206 @@ class RiscoLocal:
 
   async def _create_partition(self, partition_id):
     try:
-      status = await self._rs.send_result_command(f'PSTT{partition_id}?')
+      status = await self._rs.send_result_command(f'PSTT{partition_id}?', PRIORITY_BULK)
       if not 'E' in status:
         return None
 
-      label = await self._rs.send_result_command(f'PLBL{partition_id}?')
+      label = await self._rs.send_result_command(f'PLBL{partition_id}?', PRIORITY_BULK)
     except OperationError:
       return None
     return Partition(self, partition_id, label, status)
 
-  async def _create_zone(self, zone_id):
+  async def _reconnect(self):
+    """Reconnect after the link was lost, keeping all zones, partitions and the system.
+
+    Once reconnected only the status of each entity is read again, and
+    handlers are called for those that changed while the link was down.
+    """
+    lost_at = time.monotonic()
+    self._reconnecting = True
+    self._cancel_cache_check()
+    # the queued status reads are lost with the link, and reconciled instead
+    self._awaiting_zone_status.clear()
+    if self._discovery_task and not self._discovery_task.done():
+      # replies to the remaining discovery commands are lost with the link
+      self._discovery_task.cancel()
+      self._resume_discovery = True
+    await self._rs.close()
+
+    attempt = 0
+    while True:
+      try:
+        await self._rs.connect()
+        await self._reconcile()
+        break
+      except Exception as error:
+        # e.g. a malformed reply; nothing may stop the listener from reconnecting
+        attempt += 1
+        self._reconnect_attempts += 1
+        self._error(error)
+        await self._rs.close()
+        delay = min(self._reconnect_initial_delay * (2 ** (attempt - 1)), self._reconnect_max_delay)
+        # jitter, so panels that went down together don't reconnect in lockstep
+        await asyncio.sleep(random.uniform(delay / 2, delay))
+
+    self._reconnects += 1
+    self._reconnecting = False
+    self._recovery_time = time.monotonic() - lost_at
+    if self._resume_discovery:
+      self._resume_discovery = False
+      zone_ids = [i for i in range(1, self._panel_capabilities[MAX_ZONES] + 1) if i not in self._zones]
+      self._discovery_task = asyncio.create_task(self._discover_zones(zone_ids))
+      self._discovery_task.add_done_callback(self._discovery_done)
+
+  async def _reconcile(self):
+    # The replies are queued in order with the pushes, so a push sent before a
+    # reply can't overwrite it, and are only applied once the listener resumes
+    # after every read succeeded. A failure closes the connection, and its
+    # queue with them.
+    commands = [f'PSTT{i}?' for i in self._partitions] + [f'ZSTT*{i}?' for i in self._zones]
+    if self._system:
+      commands.append('SSTT?')
+    await asyncio.gather(*[self._rs.send_command(c, priority=PRIORITY_BULK, queue_reply=True) for c in commands])
+
+  async def _confirm(self, kind, entity_id, entity, predicate, timeout):
+    # The status push may have been handled before the command's reply
+    if predicate(entity):
+      return True
+    future = asyncio.get_running_loop().create_future()
+    waiter = (predicate, future)
+    waiters = self._confirmations.setdefault((kind, entity_id), [])
+    waiters.append(waiter)
     try:
-      zone_type = int(await self._rs.send_result_command(f'ZTYPE*{zone_id}?'))
-      if zone_type == 0:
-        return None
-
-      if self._legacy_panel:
-        tech = ''
-      else:
-        tech = await self._rs.send_result_command(f'ZLNKTYP{zone_id}?')
-        if tech.strip() == 'N':
-          return None
-
-      status = await self._rs.send_result_command(f'ZSTT*{zone_id}?')
-      if status.endswith('N'):
-        return None
-
-      label = await self._rs.send_result_command(f'ZLBL*{zone_id}?')
-      partitions = await self._rs.send_result_command(f'ZPART&*{zone_id}?')
-      if self._legacy_panel:
-        groups = '0'
-      else:
-        groups = await self._rs.send_result_command(f'ZAREA&*{zone_id}?')
-
-      return Zone(self, zone_id, status, zone_type, label, partitions, groups, tech)
-    except OperationError:
-      return None
+      return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+      return False
+    finally:
+      waiters.remove(waiter)
+      if not waiters:
+        self._confirmations.pop((kind, entity_id), None)
+
+  def _check_confirmations(self, kind, entity_id, entity):
+    for predicate, future in self._confirmations.get((kind, entity_id), ()):
+      if not future.done() and predicate(entity):
+        future.set_result(True)
+
+  def _store_system_and_partitions(self):
+    # zones are stored as they are discovered or restored
+    if self._system:
+      self._store.update(SYSTEM, None, self._system)
+    for p in self._partitions.values():
+      self._store.update(PARTITION, p.id, p)
+
+  def _changed(self, changed):
+    # changed is None for a repeated status, and a mask (maybe 0) otherwise
+    if changed is not None:
+      self._delivered += 1
+    else:
+      self._suppressed += 1
+    return changed
 
   def _system_status(self, status):
-    self._system.update_status(status)
-    RiscoLocal._call_handlers(self._system_handlers, copy.copy(self._system))
+    if self._changed(self._system.update_status(status)) is None:
+      return
+    if self._system.programming_mode:
+      # The panel configuration may change while in programming mode
+      self._rs.invalidate_queries()
+      if self._cache:
+        self._cache_task(self._cache.invalidate(self._cache_key))
+    self._call_handlers('system', self._system_handlers, self._store.update(SYSTEM, None, self._system))
 
   def _zone_status(self, zone_id, status):
-    z = self._zones[zone_id]
-    z.update_status(status)
-    RiscoLocal._call_handlers(self._zone_handlers, zone_id, copy.copy(z))
+    if zone_id in self._awaiting_zone_status:
+      # sent before the status the zone was discovered with
+      return
+    z = self._zones.get(zone_id)
+    if not z:
+      if self._discovering():
+        # keep the latest for when it is created, and whether it is newer than the status read
+        replied = self._undiscovered_zone_status.get(zone_id, (None, False))[1]
+        self._undiscovered_zone_status[zone_id] = (status, replied)
+      return
+    changed = self._changed(z.update_status(status))
+    if changed is None:
+      return
+    if self._confirmations:
+      self._check_confirmations(ZONE, zone_id, z)
+    handlers = self._zone_handlers.handlers({'zone_ids': (zone_id,), 'partitions': z._partition_ids, 'groups': z._group_names}, changed)
+    self._call_handlers(('zone', zone_id), handlers, zone_id, self._store.update(ZONE, zone_id, z))
+
+  def _zone_status_reply(self, zone_id, status):
+    # a queued reply to a status read; the pushes after it are newer
+    if zone_id in self._awaiting_zone_status:
+      self._awaiting_zone_status.discard(zone_id)
+      if status == self._zones[zone_id]._status:
+        # the status the zone was discovered with
+        return
+    if zone_id not in self._zones and self._discovering():
+      self._undiscovered_zone_status[zone_id] = (status, True)
+    else:
+      self._zone_status(zone_id, status)
 
   def _partition_status(self, partition_id, status):
     p = self._partitions[partition_id]
-    p.update_status(status)
-    RiscoLocal._call_handlers(self._partition_handlers, partition_id, copy.copy(p))
+    changed = self._changed(p.update_status(status))
+    if changed is None:
+      return
+    if self._confirmations:
+      self._check_confirmations(PARTITION, partition_id, p)
+    handlers = self._partition_handlers.handlers({'partition_ids': (partition_id,)}, changed)
+    self._call_handlers(('partition', partition_id), handlers, partition_id, self._store.update(PARTITION, partition_id, p))
+
+  def _default_message(self, message):
+    self._default(message.command, *message.fields)
 
   def _default(self, command, result, *params):
-    RiscoLocal._call_handlers(self._default_handlers, command, result, *params)
+    self._call_handlers(('default', command), self._default_handlers, command, result, *params)
 
-  def _event(self, event):
-    RiscoLocal._call_handlers(self._event_handlers, event)
+  def _event(self, text):
+    event = parse_event(text)
+    self._events.append(event)
+    self._call_handlers('event', self._event_handlers, text)
+    if self._parsed_event_handlers:
+      self._call_handlers('event', self._parsed_event_handlers, event)
 
   def _error(self, error):
-    RiscoLocal._call_handlers(self._error_handlers, error)
+    self._call_handlers('error', self._error_handlers, error)
 
-  def _call_handlers(handlers, *params):
-    if len(handlers) > 0:
-      async def _gather():
-        await asyncio.gather(*[h(*params) for h in handlers])
-      asyncio.create_task(_gather())
+  def _handler_error(self, key, error):
+    # errors raised by error handlers are not reported again
+    if key != 'error':
+      self._error(error)
+
+  def _call_handlers(self, key, handlers, *params):
+    self._dispatcher.dispatch(key, handlers, *params)
 
   async def _listen(self, queue):
     while True:
       try:
+        if self._overflow == OVERFLOW_BLOCK:
+          await self._dispatcher.wait_for_room()
         item = await queue.get()
         if isinstance(item, Exception):
           self._error(item)
           if isinstance(item, ConnectionResetError):
-            await self.disconnect()
-            break
-          continue
-
-        if item.startswith('CLOCK'):
-          # safe to ignore these
-          continue
-
-        if item.startswith("EVENT="):
-          self._event(item[6:])
+            if not self._auto_reconnect:
+              await self.disconnect()
+              break
+            await self._reconnect()
+            queue = self._rs.queue
           continue
 
-        command, result, *params = item.split("=")
-
-        if command.startswith('ZSTT'):
-          self._zone_status(int(command[4:]), result)
-        elif command.startswith('PSTT'):
-          self._partition_status(int(command[4:]), result)
-        elif command.startswith('SSTT'):
-          self._system_status(result)
-        else:
-          self._default(command, result, *params)
+        self._router.route(item)
       except Exception as error:
         self._error(error)
+
+
+def _zones_data(zones):
+  # zone metadata as kept in the cache, keyed like the JSON it is saved as
+  return { str(z.id): {
+    'type': z.type,
+    'label': z.name,
+    'partitions': z._partitions,
+    'groups': f'{z._groups:X}',
+    'tech': z._tech,
+  } for z in zones.values() }
@@ -0,0 +1,54 @@
+import asyncio
+
+READ_BUFFER_SIZE = 4096
+
+
+class RiscoProtocol(asyncio.BufferedProtocol):
+  """Protocol that parses frames as soon as bytes arrive.
+
+  Frames are handed to the owning RiscoSocket synchronously from the event loop,
+  so replies resolve their futures without a listener task in between.
+  """
+
+  def __init__(self, socket):
+    self._socket = socket
+    self._buffer = bytearray(READ_BUFFER_SIZE)
+    self._view = memoryview(self._buffer)
+    self._closed = asyncio.get_running_loop().create_future()
+    self._drain_waiter = None
+
+  def get_buffer(self, sizehint):
+    return self._view
+
+  def buffer_updated(self, nbytes):
+    frames = self._socket._parser.feed(self._view[:nbytes])
+    if frames:
+      self._socket._frames_received(frames)
+
+  def eof_received(self):
+    # Returning a falsy value closes the transport, which calls connection_lost
+    return False
+
+  def pause_writing(self):
+    if not self._drain_waiter:
+      self._drain_waiter = asyncio.get_running_loop().create_future()
+
+  def resume_writing(self):
+    waiter = self._drain_waiter
+    self._drain_waiter = None
+    if waiter and not waiter.done():
+      waiter.set_result(None)
+
+  def connection_lost(self, exc):
+    self.resume_writing()
+    if not self._closed.done():
+      self._closed.set_result(None)
+    self._socket._connection_lost(exc)
+
+  async def drain(self):
+    """Wait until the transport's write buffer drops below its low water mark."""
+    if self._drain_waiter:
+      await asyncio.shield(self._drain_waiter)
+
+  async def wait_closed(self):
+    await self._closed
@@ -1,9 +1,31 @@
 import asyncio
-from .risco_crypt import RiscoCrypt, ESCAPED_END, END
+import socket
+import time
+from collections import deque
+from .command_ids import CommandIdAllocator
+from .command_window import CommandWindow, AdaptiveCommandWindow
+from .const import PRIORITY_INTERACTIVE, PRIORITY_KEEPALIVE
+from .frame_parser import FrameParser
+from .query_cache import QueryCache, CACHED_QUERIES
+from .risco_crypt import RiscoCrypt
+from .risco_protocol import RiscoProtocol
+from .status_queue import StatusQueue
 from pyrisco.common import UnauthorizedError, CannotConnectError, OperationError
 
 MIN_CMD_ID = 1
 MAX_CMD_ID = 49
+COMMAND_TIMEOUT = 10
+KEEP_ALIVE_INTERVAL = 5
+KEEP_ALIVE_TIMEOUT = 10
+RTT_SMOOTHING = 0.25
+READ_BUFFER_SIZE = 4096
+TRANSPORT_STREAM = 'stream'
+TRANSPORT_PROTOCOL = 'protocol'
+# Risco needs a few seconds to reset its encryption state before accepting a new connection
+RECONNECT_COOLDOWN = 5
+
+# When the last connection to each (host, port) was closed
+_closed_at = {}
 
 class RiscoSocket:
   def __init__(self, host, port, code, **kwargs):
@@ -12,30 +34,119 @@ class RiscoSocket:
     self._code = code
     self._encoding = kwargs.get('encoding', 'utf-8')
     self._max_concurrency = kwargs.get('concurrency', 4)
+    self._adaptive_concurrency = kwargs.get('adaptive_concurrency', False)
+    self._keep_alive_interval = kwargs.get('keep_alive_interval', KEEP_ALIVE_INTERVAL)
+    self._keep_alive_timeout = kwargs.get('keep_alive_timeout', KEEP_ALIVE_TIMEOUT)
     self._communication_delay = kwargs.get('communication_delay', 0)
+    self._transport_type = kwargs.get('transport', TRANSPORT_STREAM)
+    self._write_high_water = kwargs.get('write_high_water')
+    self._write_low_water = kwargs.get('write_low_water')
+    self._coalesce_status = kwargs.get('coalesce_status', False)
+    self._reconnect_cooldown = kwargs.get('reconnect_cooldown', RECONNECT_COOLDOWN)
+    self._query_cache = QueryCache(kwargs.get('cached_queries', CACHED_QUERIES), kwargs.get('query_cache_ttl', 0))
     self._reader = None
     self._writer = None
+    self._transport = None
+    self._protocol = None
+    self._closing = False
+    self._write_buffer = []
+    self._flush_handle = None
+    self._bytes_written = 0
+    self._writes = 0
+    self._frames_written = 0
+    self._drain_time = 0
     self._crypt = None
+    self._parser = None
+    self._frames = None
     self._listen_task = None
     self._keep_alive_task = None
-    self._semaphore = None
+    self._last_received = 0
+    self._probe_rtt = None
+    self._failed_probes = 0
+    self._window = None
+    self._ids = None
     self._queue = None
+    self._queued_replies = set()
 
   @property
   def queue(self):
     return self._queue
 
+  @property
+  def write_stats(self):
+    """Counters for the writer: bytes, writes, frames per write and time blocked on drain."""
+    return {
+      'bytes_written': self._bytes_written,
+      'writes': self._writes,
+      'frames': self._frames_written,
+      'frames_per_write': self._frames_written / self._writes if self._writes else 0,
+      'drain_time': self._drain_time,
+    }
+
+  @property
+  def query_stats(self):
+    """Read-only queries answered from the cache, shared with a request in flight, or sent to the panel."""
+    return {
+      'hits': self._query_cache.hits,
+      'shared': self._query_cache.shared,
+      'misses': self._query_cache.misses,
+    }
+
+  def invalidate_queries(self):
+    """Drop all cached query replies, e.g. when the panel configuration may have changed."""
+    self._query_cache.clear()
+
+  @property
+  def health(self):
+    """Connection health, based on the keep-alive round trips.
+
+    The score is 1 for an instant round trip, drops towards 0 as the round trip
+    approaches the keep-alive timeout, and halves for every failed probe in a row.
+    """
+    score = 1 if self._probe_rtt is None else max(0, 1 - self._probe_rtt / self._keep_alive_timeout)
+    return {
+      'rtt': self._probe_rtt,
+      'failed_probes': self._failed_probes,
+      'idle': time.monotonic() - self._last_received if self._last_received else None,
+      'score': score * 0.5 ** self._failed_probes,
+    }
+
+  @property
+  def window_stats(self):
+    """The command window size, commands in flight, smoothed round trip time and queue wait per priority."""
+    if not self._window:
+      return None
+    return {
+      'window': self._window.size,
+      'in_flight': self._window.in_flight,
+      'rtt': self._window.rtt,
+      'queue_wait': self._window.queue_wait,
+    }
+
   async def connect(self):
-    self._cmd_id = 0
+    await self._cool_down()
     try:
-      self._semaphore = asyncio.Semaphore(self._max_concurrency)
-      self._futures = [None for i in range(MIN_CMD_ID, MIN_CMD_ID + MAX_CMD_ID)]
-      self._reader, self._writer = await asyncio.open_connection(self._host, self._port)
+      if self._adaptive_concurrency:
+        self._window = AdaptiveCommandWindow(self._max_concurrency, 1, MAX_CMD_ID)
+      else:
+        self._window = CommandWindow(self._max_concurrency)
+      self._ids = CommandIdAllocator(MIN_CMD_ID, MAX_CMD_ID)
+      self._queue = StatusQueue() if self._coalesce_status else asyncio.Queue()
+      self._crypt = RiscoCrypt(self._encoding)
+      self._parser = FrameParser()
+      if self._transport_type == TRANSPORT_PROTOCOL:
+        loop = asyncio.get_running_loop()
+        self._transport, self._protocol = await loop.create_connection(
+          lambda: RiscoProtocol(self), self._host, self._port)
+      else:
+        self._reader, self._writer = await asyncio.open_connection(self._host, self._port)
+        self._transport = self._writer.transport
+        self._frames = deque()
+      self._configure_transport()
       if self._communication_delay > 0:
         await asyncio.sleep(self._communication_delay)
-      self._queue = asyncio.Queue()
-      self._listen_task = asyncio.create_task(self._listen())
-      self._crypt = RiscoCrypt(self._encoding)
+      if self._reader:
+        self._listen_task = asyncio.create_task(self._listen())
       panel_id = int(await self.send_result_command('RID'), 16)
       self._crypt.set_panel_id(panel_id)
       if not await self.send_ack_command('LCL'):
@@ -44,13 +155,15 @@ class RiscoSocket:
       if not await self.send_ack_command(command):
         raise UnauthorizedError
 
+      self._probe_rtt = None
+      self._failed_probes = 0
       self._keep_alive_task = asyncio.create_task(self._keep_alive())
     except Exception as exc:
       await self._close()
       raise CannotConnectError from exc
 
   async def disconnect(self):
-    if self._writer:
+    if self._transport:
       try:
         await self.send_ack_command('DCN')
       except OperationError:
@@ -59,77 +172,206 @@ class RiscoSocket:
       finally:
         await self._close()
 
+  async def close(self):
+    """Close the connection without telling the panel, e.g. once the link is lost."""
+    if self._transport:
+      await self._close()
+
+  async def _cool_down(self):
+    # If we connect too soon after the last connection was closed, the
+    # connection will be encrypted before we get the panel id
+    closed_at = _closed_at.get((self._host, self._port))
+    if closed_at is not None:
+      delay = closed_at + self._reconnect_cooldown - time.monotonic()
+      if delay > 0:
+        await asyncio.sleep(delay)
+
   async def _listen(self):
     while True:
       try:
         cmd_id, command, crc = await self._read_command()
-        if not cmd_id:
-          self._decrement_cmd_id()
-          raise OperationError(f'Risco error: {command}')
-        if cmd_id <= MAX_CMD_ID:
-          future = self._futures[cmd_id-1]
-          self._futures[cmd_id-1] = None
-          if not crc:
-            future.set_exception(OperationError(f'cmd_id: {cmd_id}, Wrong CRC'))
-          elif command[0] in ['N', 'B']:
-            future.set_exception(OperationError(f'cmd_id: {cmd_id}, Risco error: {command}'))
-          else:
-            future.set_result(command)
-        else:
-          await self._handle_incoming(cmd_id, command, crc)
+        self._handle_command(cmd_id, command, crc)
       except ConnectionResetError as error:
-        await self._queue.put(error)
+        self._queue.put_nowait(error)
         break
       except Exception as error:
-        await self._queue.put(error)
+        self._queue.put_nowait(error)
 
+  def _frames_received(self, frames):
+    # Called by RiscoProtocol, straight from the event loop
+    for frame in frames:
+      try:
+        self._handle_command(*self._crypt.decode(frame))
+      except Exception as error:
+        self._queue.put_nowait(error)
+
+  def _connection_lost(self, error):
+    if self._queue and not self._closing:
+      self._queue.put_nowait(error or ConnectionResetError('Connection closed by the panel'))
+
+  def _handle_command(self, cmd_id, command, crc):
+    self._last_received = time.monotonic()
+    if not cmd_id:
+      future = self._ids.resolve_oldest()
+      if future is None or future.done():
+        raise OperationError(f'Risco error: {command}')
+      future.set_exception(OperationError(f'Risco error: {command}'))
+    elif cmd_id <= MAX_CMD_ID:
+      future = self._ids.resolve(cmd_id)
+      if future is None or future.done():
+        # a late reply to a command that timed out
+        return
+      if not crc:
+        future.set_exception(OperationError(f'cmd_id: {cmd_id}, Wrong CRC'))
+      elif command[0] in ['N', 'B']:
+        future.set_exception(OperationError(f'cmd_id: {cmd_id}, Risco error: {command}'))
+      else:
+        future.set_result(command)
+        if future in self._queued_replies:
+          self._queue.put_nowait(command)
+    else:
+      self._handle_incoming(cmd_id, command, crc)
 
   async def _keep_alive(self):
+    # Only probe a quiet connection; any received frame proves the link is alive
     while True:
+      idle = time.monotonic() - self._last_received
+      if idle < self._keep_alive_interval:
+        await asyncio.sleep(self._keep_alive_interval - idle)
+        continue
+
+      start = time.monotonic()
       try:
-        await self.send_result_command("CLOCK")
-      except OperationError as error:
-        await self._queue.put(error)
+        # bound the whole probe, including any wait for a free command slot
+        await asyncio.wait_for(self.send_command("CLOCK", priority=PRIORITY_KEEPALIVE), self._keep_alive_timeout)
+        self._record_probe(time.monotonic() - start)
+      except (OperationError, asyncio.TimeoutError) as error:
+        self._failed_probes += 1
+        if self._last_received < start:
+          # nothing at all came back within the timeout, the link is dead
+          self._queue.put_nowait(ConnectionResetError(f'No response from panel for {time.monotonic() - self._last_received:.1f} seconds'))
+          break
+        self._queue.put_nowait(error if isinstance(error, OperationError) else OperationError('Timeout in command: CLOCK'))
+        await asyncio.sleep(self._keep_alive_interval)
 
-      await asyncio.sleep(5)
+  def _record_probe(self, rtt):
+    self._failed_probes = 0
+    if self._probe_rtt is None:
+      self._probe_rtt = rtt
+    else:
+      self._probe_rtt += RTT_SMOOTHING * (rtt - self._probe_rtt)
+
+  async def send_ack_command(self, command, priority=PRIORITY_INTERACTIVE):
+    result = await self.send_command(command, priority=priority)
+    if result != 'ACK':
+      return False
+    if '=' in command:
+      self._query_cache.invalidate(command)
+    return True
 
-  async def send_ack_command(self, command):
-    command = await self.send_command(command)
-    return command == 'ACK'
+  async def send_result_command(self, command, priority=PRIORITY_INTERACTIVE):
+    if self._query_cache.cacheable(command):
+      return await self._query_cache.get(command, lambda: self._send_result_command(command, priority))
+    return await self._send_result_command(command, priority)
 
-  async def send_result_command(self, command):
-    command = await self.send_command(command)
+  async def _send_result_command(self, command, priority):
+    command = await self.send_command(command, priority=priority)
     return command.split("=")[1]
 
-  async def send_command(self, command, force_encryption=False):
-    async with self._semaphore:
-      self._increment_cmd_id()
-      self._write_command(self._cmd_id, command, force_encryption)
-      future = asyncio.Future()
-      self._futures[self._cmd_id-1] = future
+  async def send_command(self, command, force_encryption=False, priority=PRIORITY_INTERACTIVE, timeout=COMMAND_TIMEOUT, queue_reply=False):
+    """Send `command` and return the panel's reply.
+
+    With queue_reply=True a successful reply is also put on `queue`, in the
+    order it arrived relative to the pushes.
+    """
+    window = self._window
+    if not window:
+      raise OperationError(f'Not connected, command: {command}')
+    await window.acquire(priority)
+    start = time.monotonic()
+    # anything but a reply, including cancellation, e.g. a timed out keep-alive probe
+    error = True
+    try:
+      if window is not self._window:
+        # the connection was closed while we waited for a slot
+        raise OperationError(f'Connection closed, command: {command}')
+      await self._drain()
+      ids = self._ids
+      future = asyncio.get_running_loop().create_future()
+      cmd_id = await ids.acquire(future)
+      if queue_reply:
+        self._queued_replies.add(future)
+      self._write_command(cmd_id, command, force_encryption)
       try:
-        return await asyncio.wait_for(future, 10)
+        reply = await asyncio.wait_for(future, timeout)
       except asyncio.TimeoutError:
         raise OperationError(f'Timeout in command: {command}')
+      finally:
+        # no-op if the reply already released the id
+        ids.quarantine(cmd_id, future)
+        self._queued_replies.discard(future)
+      error = False
+      return reply
+    finally:
+      window.release(time.monotonic() - start, error)
 
-  async def _handle_incoming(self, cmd_id, command, crc):
+  def _handle_incoming(self, cmd_id, command, crc):
     self._write_command(cmd_id, 'ACK')
     if not crc:
-      await self._queue.put(OperationError(f'cmd_id: {cmd_id}, Wrong CRC'))
+      self._queue.put_nowait(OperationError(f'cmd_id: {cmd_id}, Wrong CRC'))
     else:
-      await self._queue.put(command)
+      self._queue.put_nowait(command)
 
   async def _read_command(self):
-    buffer = await self._reader.readuntil(END)
-    while buffer.endswith(ESCAPED_END):
-      buffer += await self._reader.readuntil(END)
-    return self._crypt.decode(buffer)
+    while not self._frames:
+      data = await self._reader.read(READ_BUFFER_SIZE)
+      if not data:
+        raise ConnectionResetError('Connection closed by the panel')
+      self._frames.extend(self._parser.feed(data))
+    return self._crypt.decode(self._frames.popleft())
 
   def _write_command(self, cmd_id, command, force_encryption=False):
-    buffer = self._crypt.encode(cmd_id, command, force_encryption)
-    self._writer.write(buffer)
+    # Frames queued in the same loop iteration go out in a single write
+    self._write_buffer.append(self._crypt.encode(cmd_id, command, force_encryption))
+    if not self._flush_handle:
+      self._flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+
+  def _flush(self):
+    self._flush_handle = None
+    if not self._write_buffer:
+      return
+    data = b''.join(self._write_buffer)
+    self._frames_written += len(self._write_buffer)
+    self._write_buffer.clear()
+    if not self._transport or self._transport.is_closing():
+      return
+    self._transport.write(data)
+    self._bytes_written += len(data)
+    self._writes += 1
+
+  async def _drain(self):
+    # Wait while the transport's write buffer is above its high water mark
+    start = time.monotonic()
+    try:
+      if self._writer:
+        await self._writer.drain()
+      else:
+        await self._protocol.drain()
+    except OSError as error:
+      # e.g. BrokenPipeError once the link is gone
+      raise OperationError(f'Connection lost: {error!r}') from error
+    self._drain_time += time.monotonic() - start
+
+  def _configure_transport(self):
+    if self._write_high_water is not None or self._write_low_water is not None:
+      self._transport.set_write_buffer_limits(self._write_high_water, self._write_low_water)
+    # Small command frames are already coalesced, so don't let Nagle delay them further
+    sock = self._transport.get_extra_info('socket')
+    if sock is not None:
+      sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
   async def _close(self):
+    self._closing = True
     if self._keep_alive_task:
       self._keep_alive_task.cancel()
       self._keep_alive_task = None
@@ -138,24 +380,34 @@ class RiscoSocket:
       self._listen_task.cancel()
       self._listen_task = None
 
+    if self._flush_handle:
+      self._flush_handle.cancel()
+    self._flush()
+
     if self._writer:
       self._writer.close()
-      await self._writer.wait_closed()
+      try:
+        await self._writer.wait_closed()
+      except OSError:
+        # the link already failed
+        pass
+    elif self._protocol:
+      self._transport.close()
+      await self._protocol.wait_closed()
+    if self._transport:
+      _closed_at[(self._host, self._port)] = time.monotonic()
     self._crypt = None
+    self._parser = None
+    self._frames = None
     self._writer = None
     self._reader = None
-    self._semaphore = None
+    self._transport = None
+    self._protocol = None
+    self._window = None
+    if self._ids:
+      self._ids.clear(OperationError('Connection closed'))
+    self._ids = None
     self._queue = None
-    # Risco needs a few seconds to reset its encryption state before accepting a new connection
-    # If we don't sleep here, the next connection will be encrypted before we get the panel id.
-    await asyncio.sleep(5)
-
-  def _increment_cmd_id(self):
-    self._cmd_id += 1
-    if self._cmd_id > MAX_CMD_ID:
-      self._cmd_id = MIN_CMD_ID
-
-  def _decrement_cmd_id(self):
-    self._cmd_id -= 1
-    if self._cmd_id < MIN_CMD_ID:
-      self._cmd_id = MAX_CMD_ID
+    self._queued_replies.clear()
+    self._query_cache.clear()
+    self._closing = False
@@ -0,0 +1,71 @@
+import copy
+from collections import OrderedDict
+from types import MappingProxyType
+
+ZONE = 'zone'
+PARTITION = 'partition'
+SYSTEM = 'system'
+
+
+class Snapshot:
+  """A consistent, read-only view of the panel state as of sequence number `seq`."""
+  __slots__ = ('seq', 'zones', 'partitions', 'system')
+
+  def __init__(self, seq, zones, partitions, system):
+    self.seq = seq
+    self.zones = MappingProxyType(zones)
+    self.partitions = MappingProxyType(partitions)
+    self.system = system
+
+
+class StateStore:
+  """Versions every zone, partition and system update with an increasing sequence number.
+
+  The store holds a copy of each entity as of its last update, so views handed
+  out are never changed afterwards and unchanged entities are shared between
+  them. Entries are kept in update order, so `changes_since()` only walks the
+  entries that changed.
+  """
+
+  def __init__(self):
+    self._seq = 0
+    self._entries = OrderedDict()
+    self._snapshot = None
+
+  @property
+  def seq(self):
+    """The sequence number of the latest update."""
+    return self._seq
+
+  def update(self, kind, entity_id, entity):
+    """Record a new state of an entity, and return the copy that was stored."""
+    entity = copy.copy(entity)
+    self._seq += 1
+    key = (kind, entity_id)
+    self._entries[key] = (self._seq, entity)
+    self._entries.move_to_end(key)
+    return entity
+
+  def snapshot(self):
+    """The current state, as a `Snapshot`."""
+    if not self._snapshot or self._snapshot.seq != self._seq:
+      zones, partitions, system = {}, {}, None
+      for (kind, entity_id), (seq, entity) in self._entries.items():
+        if kind == ZONE:
+          zones[entity_id] = entity
+        elif kind == PARTITION:
+          partitions[entity_id] = entity
+        else:
+          system = entity
+      self._snapshot = Snapshot(self._seq, zones, partitions, system)
+    return self._snapshot
+
+  def changes_since(self, seq):
+    """The latest state of every entity updated after `seq`, as (seq, kind, entity_id, entity) in update order."""
+    changes = []
+    for (kind, entity_id), (entry_seq, entity) in reversed(self._entries.items()):
+      if entry_seq <= seq:
+        break
+      changes.append((entry_seq, kind, entity_id, entity))
+    changes.reverse()
+    return changes
@@ -0,0 +1,6 @@
+def parse_flags(status, flags):
+  """Fold the characters of a status string into a bitmask, using the `flags` map of character to bit."""
+  mask = 0
+  for char in status:
+    mask |= flags.get(char, 0)
+  return mask
@@ -0,0 +1,58 @@
+import asyncio
+from collections import deque
+
+STATUS_PREFIXES = ('ZSTT', 'PSTT', 'SSTT')
+
+
+def status_key(item):
+  """The entity a status message belongs to (e.g. 'ZSTT12'), or None for anything else.
+
+  A queued reply to a status query (e.g. 'ZSTT*12=') belongs to the same entity.
+  """
+  if isinstance(item, str) and item.startswith(STATUS_PREFIXES):
+    key, sep, _ = item.partition('=')
+    if sep:
+      return key.replace('*', '')
+  return None
+
+
+class StatusQueue(asyncio.Queue):
+  """A queue that keeps only the newest pending status per entity.
+
+  A status message replaces the pending one for the same entity in place, so
+  it is delivered at the position of the first one. Once a reply to a status
+  query is pending, the newest status is delivered in the form of that reply. Events, errors and any
+  other messages are never coalesced and keep their order. The queue size is
+  bounded by the number of entities plus the other messages pending.
+  """
+
+  def _init(self, maxsize):
+    self._queue = deque()
+    self._latest = {}
+    self.coalesced = 0
+
+  def _qsize(self):
+    return len(self._queue)
+
+  def _put(self, item):
+    key = status_key(item)
+    if key is None:
+      self._queue.append((None, item))
+    elif key in self._latest:
+      pending = self._latest[key].partition('=')[0]
+      if '*' in pending:
+        # still marks where the reply to the status query was
+        item = pending + '=' + item.partition('=')[2]
+      self._latest[key] = item
+      self.coalesced += 1
+      # no new item to account for in task_done()/join()
+      self._unfinished_tasks -= 1
+    else:
+      self._latest[key] = item
+      self._queue.append((key, None))
+
+  def _get(self):
+    key, item = self._queue.popleft()
+    if key is None:
+      return item
+    return self._latest.pop(key)
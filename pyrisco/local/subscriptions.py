@@ -0,0 +1,71 @@
+class Subscription:
+  __slots__ = ('order', 'handler', 'mask', 'filters')
+
+  def __init__(self, order, handler, mask, filters):
+    self.order = order
+    self.handler = handler
+    self.mask = mask
+    self.filters = filters
+
+  def matches(self, values, changed):
+    if self.mask is not None and not self.mask & changed:
+      return False
+    for dimension, allowed in self.filters.items():
+      if allowed.isdisjoint(values[dimension]):
+        return False
+    return True
+
+
+class Subscriptions:
+  """Handlers indexed by the entities they are interested in.
+
+  A handler with filters (e.g. zone_ids and partitions) is indexed by the
+  first of `dimensions` it filters on, and called when an entity matches all
+  of its filters. Finding the handlers for an update only touches the index
+  entries of that entity and the unfiltered handlers.
+  """
+
+  def __init__(self, dimensions):
+    self._dimensions = dimensions
+    self._order = 0
+    self._unfiltered = {}
+    self._index = {}
+
+  def add(self, handler, mask=None, **filters):
+    """Subscribe `handler`, and return a callable that unsubscribes it."""
+    filters = { d: frozenset(v) for d, v in filters.items() if v is not None }
+    self._order += 1
+    subscription = Subscription(self._order, handler, mask, filters)
+    dimension = next((d for d in self._dimensions if d in filters), None)
+    if dimension is None:
+      buckets = [self._unfiltered]
+    else:
+      buckets = [self._index.setdefault((dimension, v), {}) for v in filters[dimension]]
+    for bucket in buckets:
+      bucket[subscription] = None
+
+    def _remove():
+      for bucket in buckets:
+        bucket.pop(subscription, None)
+      if dimension is not None:
+        for v in filters[dimension]:
+          if not self._index.get((dimension, v), True):
+            del self._index[(dimension, v)]
+    return _remove
+
+  def handlers(self, values, changed=-1):
+    """The handlers, in subscription order, interested in an entity with `values` per dimension whose `changed` flags changed."""
+    found = [s for s in self._unfiltered if s.matches(values, changed)]
+    if not self._index:
+      return [s.handler for s in found]
+
+    indexed = {}
+    for dimension in self._dimensions:
+      for v in values[dimension]:
+        bucket = self._index.get((dimension, v))
+        if bucket:
+          indexed.update(bucket)
+    if indexed:
+      found.extend(s for s in indexed if s.matches(values, changed))
+      found.sort(key=lambda s: s.order)
+    return [s.handler for s in found]
@@ -1,11 +1,37 @@
 from pyrisco.common import System as BaseSystem
+from .status_flags import parse_flags
+
+LOW_BATTERY_TROUBLE = 1
+AC_TROUBLE = 2
+MONITORING_STATION_1_TROUBLE = 4
+MONITORING_STATION_2_TROUBLE = 8
+MONITORING_STATION_3_TROUBLE = 16
+PHONE_LINE_TROUBLE = 32
+CLOCK_TROUBLE = 64
+BOX_TAMPER = 128
+PROGRAMMING_MODE = 256
+STATUS_FLAGS = {
+  'B': LOW_BATTERY_TROUBLE,
+  'A': AC_TROUBLE,
+  '1': MONITORING_STATION_1_TROUBLE,
+  '2': MONITORING_STATION_2_TROUBLE,
+  '3': MONITORING_STATION_3_TROUBLE,
+  'P': PHONE_LINE_TROUBLE,
+  'C': CLOCK_TROUBLE,
+  'X': BOX_TAMPER,
+  'I': PROGRAMMING_MODE,
+}
+
 
 class System(BaseSystem):
+  __slots__ = ('_panel', '_status', '_flags', '_name')
+
   def __init__(self, panel, label, status):
       """Read system from response."""
       self._panel = panel
-      self._status = status
       self._name = label.strip()
+      self._status = status
+      self._flags = parse_flags(status, STATUS_FLAGS)
 
   @property
   def name(self):
@@ -14,39 +40,50 @@ class System(BaseSystem):
 
   @property
   def low_battery_trouble(self):
-      return 'B' in self._status
+      return bool(self._flags & LOW_BATTERY_TROUBLE)
 
   @property
   def ac_trouble(self):
-      return 'A' in self._status
+      return bool(self._flags & AC_TROUBLE)
 
   @property
   def monitoring_station_1_trouble(self):
-      return '1' in self._status
+      return bool(self._flags & MONITORING_STATION_1_TROUBLE)
 
   @property
   def monitoring_station_2_trouble(self):
-      return '2' in self._status
+      return bool(self._flags & MONITORING_STATION_2_TROUBLE)
 
   @property
   def monitoring_station_3_trouble(self):
-      return '3' in self._status
+      return bool(self._flags & MONITORING_STATION_3_TROUBLE)
 
   @property
   def phone_line_trouble(self):
-      return 'P' in self._status
+      return bool(self._flags & PHONE_LINE_TROUBLE)
 
   @property
   def clock_trouble(self):
-      return 'C' in self._status
+      return bool(self._flags & CLOCK_TROUBLE)
 
   @property
   def box_tamper(self):
-      return 'X' in self._status
+      return bool(self._flags & BOX_TAMPER)
 
   @property
   def programming_mode(self):
-      return 'I' in self._status
+      return bool(self._flags & PROGRAMMING_MODE)
 
   def update_status(self, status):
+    """Update the status, and return a mask of the flags that changed.
+
+    Returns None if the status is unchanged, and 0 if it changed without any
+    known flag changing.
+    """
+    if status == self._status:
+      return None
     self._status = status
+    flags = parse_flags(status, STATUS_FLAGS)
+    changed = flags ^ self._flags
+    self._flags = flags
+    return changed
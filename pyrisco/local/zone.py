@@ -1,15 +1,41 @@
+from functools import lru_cache
 from pyrisco.common import GROUP_ID_TO_NAME, Zone as BaseZone
+from .status_flags import parse_flags
+
+TRIGGERED = 1
+ALARMED = 2
+ARMED = 4
+BYPASSED = 8
+LOW_BATTERY = 16
+STATUS_FLAGS = {'O': TRIGGERED, 'a': ALARMED, 'A': ARMED, 'Y': BYPASSED, 'b': LOW_BATTERY}
+
+
+# Most zones share the same few memberships, so they share the parsed tuples too
+@lru_cache(maxsize=None)
+def _partition_ids(partitions):
+  return tuple(i*4 + p + 1 for i, c in enumerate(partitions) for p in range(0,4) if ((2**p) & int(c, 16)) > 0)
+
+
+@lru_cache(maxsize=None)
+def _group_names(groups):
+  return tuple(GROUP_ID_TO_NAME[i] for i in range(0,4) if ((2**i) & groups) > 0)
+
 
 class Zone(BaseZone):
+  __slots__ = ('_panel', '_id', '_status', '_flags', '_type', '_name', '_partitions', '_groups', '_tech', '_partition_ids', '_group_names')
+
   def __init__(self, panel, zone_id, status, zone_type, label, partitions, groups, tech):
     self._panel = panel
     self._id = zone_id
-    self._status = status
     self._type = zone_type
     self._name = label.strip()
     self._partitions = partitions
     self._groups = int(groups, 16)
     self._tech = tech
+    self._partition_ids = _partition_ids(partitions)
+    self._group_names = _group_names(self._groups)
+    self._status = status
+    self._flags = parse_flags(status, STATUS_FLAGS)
 
   async def bypass(self, bypass):
     """Bypass or unbypass the zone."""
@@ -33,38 +59,48 @@ class Zone(BaseZone):
   @property
   def triggered(self):
       """Is the zone triggered."""
-      return 'O' in self._status
+      return bool(self._flags & TRIGGERED)
 
   @property
   def alarmed(self):
       """Is the zone causing an alarm."""
-      return 'a' in self._status
+      return bool(self._flags & ALARMED)
 
   @property
   def armed(self):
       """Is the zone armed."""
-      return 'A' in self._status
+      return bool(self._flags & ARMED)
 
   @property
   def bypassed(self):
       """Is the zone bypassed."""
-      return 'Y' in self._status
+      return bool(self._flags & BYPASSED)
 
   @property
   def low_battery(self):
       """Does the zone have low battery."""
-      return 'b' in self._status
+      return bool(self._flags & LOW_BATTERY)
 
   @property
   def groups(self):
       """Groups the zone belongs to."""
-      return [GROUP_ID_TO_NAME[i] for i in range(0,4) if ((2**i) & self._groups) > 0]
+      return list(self._group_names)
 
   @property
   def partitions(self):
       """partitions the zone belongs to."""
-      ps = zip([int(p, 16) for p in self._partitions], range(0, len(self._partitions)))
-      return [i*4 + p + 1 for c, i in ps for p in range(0,4) if ((2**p) & c) > 0]
+      return list(self._partition_ids)
 
   def update_status(self, status):
+    """Update the status, and return a mask of the flags that changed.
+
+    Returns None if the status is unchanged, and 0 if it changed without any
+    known flag changing.
+    """
+    if status == self._status:
+      return None
     self._status = status
+    flags = parse_flags(status, STATUS_FLAGS)
+    changed = flags ^ self._flags
+    self._flags = flags
+    return changed
@@ -0,0 +1,119 @@
+import asyncio
+from pyrisco.local.frame_parser import FrameParser
+from pyrisco.local.risco_crypt import RiscoCrypt, START, ENCRYPTED_START, END, _escape
+
+PANEL_ID = 0x1234
+
+
+class FakePanel:
+  """A minimal panel that answers commands over a real TCP socket.
+
+  `responses` maps a command to its reply, or to a callable returning the reply,
+  an awaitable of it, or None to stay silent.
+  """
+
+  def __init__(self, responses=None):
+    self.responses = {
+      'RID': f'RID={PANEL_ID:04X}',
+      'LCL': 'ACK',
+      'RMT=1234': 'ACK',
+      'CLOCK': 'CLOCK=01/01/2026 10:00',
+      'DCN': 'ACK',
+    }
+    self.responses.update(responses or {})
+    self.received = []
+    self.reads = 0
+    self._crypt = RiscoCrypt()
+    self._crypt.set_panel_id(PANEL_ID)
+    self._server = None
+    self._writer = None
+    self._push_id = 50
+
+  @property
+  def port(self):
+    return self._server.sockets[0].getsockname()[1]
+
+  async def start(self):
+    self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+
+  async def stop(self):
+    if self._writer:
+      self._writer.close()
+    self._server.close()
+    await self._server.wait_closed()
+
+  def push(self, command):
+    """Send an unsolicited message, as the panel does for status changes."""
+    self._push_id = self._push_id + 1 if self._push_id < 99 else 50
+    self._writer.write(self._crypt.encode(self._push_id, command, True))
+
+  def drop(self):
+    """Simulate the link going down."""
+    self._writer.transport.abort()
+
+  async def _handle(self, reader, writer):
+    self._writer = writer
+    parser = FrameParser()
+    while True:
+      data = await reader.read(4096)
+      if not data:
+        break
+      self.reads += 1
+      for frame in parser.feed(data):
+        cmd_id, command, crc = self._crypt.decode(frame)
+        encrypted = self._crypt.encrypted_panel
+        self.received.append(command)
+        if cmd_id > 49:
+          continue
+        response = self.responses.get(command, 'N05')
+        if callable(response):
+          response = response(command)
+        if asyncio.iscoroutine(response):
+          asyncio.create_task(self._reply_later(writer, cmd_id, response, encrypted))
+        elif response is not None:
+          writer.write(self._encode(cmd_id, response, encrypted))
+
+  async def _reply_later(self, writer, cmd_id, response, encrypted):
+    response = await response
+    if response is not None:
+      writer.write(self._encode(cmd_id, response, encrypted))
+
+  def _encode(self, cmd_id, response, encrypted):
+    if response[0] not in 'NB':
+      return self._crypt.encode(cmd_id, response, encrypted)
+    # error replies carry no command id
+    body = response.encode() + b'\x17'
+    body += self._crypt._get_crc(body)
+    if encrypted:
+      body = self._crypt._xor(body)
+    return (ENCRYPTED_START if encrypted else START) + _escape(body) + END
+
+
+def panel_responses(panel_type='RW032', firmware='', max_zones=32, max_partitions=3, zones=None, partitions=None, system_status='----'):
+  """Responses describing a whole panel.
+
+  `zones` maps a zone id to (type, label, status, partitions), `partitions`
+  maps a partition id to (label, status). Anything else is not configured.
+  """
+  zones = zones or {}
+  partitions = partitions or {}
+  responses = {
+    'PNLCNF': f'PNLCNF={panel_type}',
+    'FSVER?': f'FSVER={firmware}',
+    'PNLSERD': 'PNLSERD=00012345',
+    'SYSLBL?': 'SYSLBL=Home            ',
+    'SSTT?': f'SSTT={system_status}',
+  }
+  for i in range(1, max_zones + 1):
+    zone_type, label, status, zone_partitions = zones.get(i, (0, '', '----------N', '0'))
+    responses[f'ZTYPE*{i}?'] = f'ZTYPE*{i}={zone_type}'
+    responses[f'ZLNKTYP{i}?'] = f'ZLNKTYP{i}={"W" if i in zones else "N"}'
+    responses[f'ZSTT*{i}?'] = f'ZSTT*{i}={status}'
+    responses[f'ZLBL*{i}?'] = f'ZLBL*{i}={label:<16}'
+    responses[f'ZPART&*{i}?'] = f'ZPART&*{i}={zone_partitions}'
+    responses[f'ZAREA&*{i}?'] = f'ZAREA&*{i}=1'
+  for i in range(1, max_partitions + 1):
+    label, status = partitions.get(i, ('', '---'))
+    responses[f'PSTT{i}?'] = f'PSTT{i}={status}'
+    responses[f'PLBL{i}?'] = f'PLBL{i}={label:<16}'
+  return responses
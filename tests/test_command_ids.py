@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+from pyrisco.local.command_ids import CommandIdAllocator
+
+
+class TestCommandIdAllocator(unittest.IsolatedAsyncioTestCase):
+
+  async def test_ids_rotate(self):
+    ids = CommandIdAllocator(1, 3)
+    first = await ids.acquire(None)
+    ids.resolve(first)
+    second = await ids.acquire(None)
+    self.assertEqual((first, second), (1, 2))
+
+  async def test_pending_id_is_never_reused(self):
+    ids = CommandIdAllocator(1, 2)
+    futures = [asyncio.Future(), asyncio.Future()]
+    self.assertEqual(await ids.acquire(futures[0]), 1)
+    self.assertEqual(await ids.acquire(futures[1]), 2)
+    waiter = asyncio.create_task(ids.acquire(None))
+    await asyncio.sleep(0)
+    self.assertFalse(waiter.done())
+    self.assertIs(ids.resolve(2), futures[1])
+    self.assertEqual(await waiter, 2)
+
+  async def test_late_reply_releases_quarantined_id(self):
+    ids = CommandIdAllocator(1, 1)
+    future = asyncio.Future()
+    await ids.acquire(future)
+    ids.quarantine(1, future)
+    self.assertEqual(ids.quarantined, 1)
+    waiter = asyncio.create_task(ids.acquire(None))
+    await asyncio.sleep(0)
+    self.assertFalse(waiter.done())
+    # the late reply resolves nothing, but frees the id
+    self.assertIsNone(ids.resolve(1))
+    self.assertEqual(await waiter, 1)
+
+  async def test_quarantine_expires(self):
+    ids = CommandIdAllocator(1, 1, grace_period=0.01)
+    future = asyncio.Future()
+    await ids.acquire(future)
+    ids.quarantine(1, future)
+    self.assertEqual(await asyncio.wait_for(ids.acquire(None), 1), 1)
+    self.assertEqual(ids.quarantined, 0)
+
+  async def test_quarantine_ignores_reacquired_id(self):
+    ids = CommandIdAllocator(1, 1)
+    first, second = asyncio.Future(), asyncio.Future()
+    await ids.acquire(first)
+    ids.resolve(1)
+    await ids.acquire(second)
+    ids.quarantine(1, first)
+    self.assertEqual(ids.quarantined, 0)
+    self.assertIs(ids.resolve(1), second)
+
+  async def test_resolve_oldest_quarantines_guessed_id(self):
+    ids = CommandIdAllocator(1, 2)
+    older, newer = asyncio.Future(), asyncio.Future()
+    await ids.acquire(older)
+    await ids.acquire(newer)
+    # the panel answers in order, so an error without an id is the older one's
+    self.assertIs(ids.resolve_oldest(), older)
+    self.assertEqual(ids.quarantined, 1)
+    waiter = asyncio.create_task(ids.acquire(None))
+    await asyncio.sleep(0)
+    self.assertFalse(waiter.done())
+    self.assertIs(ids.resolve(2), newer)
+    self.assertEqual(await waiter, 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
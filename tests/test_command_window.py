@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from pyrisco.local.command_window import CommandWindow, AdaptiveCommandWindow
+from pyrisco.local.const import PRIORITY_CONTROL, PRIORITY_INTERACTIVE, PRIORITY_BULK, PRIORITY_KEEPALIVE
+
+
+class TestCommandWindow(unittest.IsolatedAsyncioTestCase):
+
+  async def test_fixed_window_limits_in_flight(self):
+    window = CommandWindow(2)
+    await window.acquire()
+    await window.acquire()
+    waiter = asyncio.create_task(window.acquire())
+    await asyncio.sleep(0)
+    self.assertFalse(waiter.done())
+    window.release(0.01)
+    await waiter
+    self.assertEqual(window.in_flight, 2)
+    self.assertEqual(window.rtt, 0.01)
+
+  async def _queue(self, window, order, name, priority):
+    await window.acquire(priority)
+    order.append(name)
+
+  async def test_higher_priority_goes_first(self):
+    window = CommandWindow(1)
+    await window.acquire()
+    order = []
+    tasks = [
+      asyncio.create_task(self._queue(window, order, 'bulk', PRIORITY_BULK)),
+      asyncio.create_task(self._queue(window, order, 'keepalive', PRIORITY_KEEPALIVE)),
+      asyncio.create_task(self._queue(window, order, 'control', PRIORITY_CONTROL)),
+    ]
+    await asyncio.sleep(0)
+    for i in range(3):
+      window.release(0.01)
+      await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    self.assertEqual(order, ['control', 'bulk', 'keepalive'])
+    self.assertEqual(window.queue_wait[PRIORITY_CONTROL]['count'], 1)
+
+  async def test_starved_command_is_promoted_one_class(self):
+    window = CommandWindow(1)
+    await window.acquire()
+    order = []
+    tasks = [asyncio.create_task(self._queue(window, order, 'bulk', PRIORITY_BULK))]
+    await asyncio.sleep(0.05)
+    tasks.append(asyncio.create_task(self._queue(window, order, 'interactive', PRIORITY_INTERACTIVE)))
+    tasks.append(asyncio.create_task(self._queue(window, order, 'control', PRIORITY_CONTROL)))
+    await asyncio.sleep(0)
+    with patch('pyrisco.local.command_window.STARVATION_TIMEOUT', 0.03):
+      for i in range(3):
+        window.release(0.01)
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    self.assertEqual(order, ['control', 'bulk', 'interactive'])
+
+  async def test_control_wait_bounded_behind_starved_bulk_work(self):
+    # far more queued bulk work than the starvation timeout
+    window = CommandWindow(4)
+    async def _command(priority):
+      await window.acquire(priority)
+      await asyncio.sleep(0.005)
+      window.release(0.005)
+    with patch('pyrisco.local.command_window.STARVATION_TIMEOUT', 0.1):
+      bulk = [asyncio.create_task(_command(PRIORITY_BULK)) for i in range(400)]
+      await asyncio.sleep(0.2)
+      start = asyncio.get_running_loop().time()
+      await _command(PRIORITY_CONTROL)
+      waited = asyncio.get_running_loop().time() - start
+      for task in bulk:
+        task.cancel()
+      await asyncio.gather(*bulk, return_exceptions=True)
+    # about one slot, not the whole bulk backlog
+    self.assertLess(waited, 0.05)
+
+  async def test_adaptive_window_grows_while_rtt_is_flat(self):
+    window = AdaptiveCommandWindow(4, 1, 49)
+    for i in range(100):
+      await window.acquire()
+      window.release(0.01)
+    self.assertGreater(window.size, 4)
+    self.assertLessEqual(window.size, 49)
+
+  async def test_adaptive_window_shrinks_on_error(self):
+    window = AdaptiveCommandWindow(16, 1, 49)
+    await window.acquire()
+    window.release(0.01, error=True)
+    self.assertEqual(window.size, 8)
+
+  async def test_adaptive_window_shrinks_on_rising_rtt(self):
+    window = AdaptiveCommandWindow(16, 1, 49)
+    await window.acquire()
+    window.release(0.01)
+    for i in range(20):
+      await window.acquire()
+      window._last_decrease = 0
+      window.release(0.1)
+    self.assertEqual(window.size, 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,125 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from pyrisco.local.dispatcher import HandlerDispatcher, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST
+
+
+class TestHandlerDispatcher(unittest.IsolatedAsyncioTestCase):
+
+  async def test_calls_for_a_key_run_in_order(self):
+    dispatcher = HandlerDispatcher(workers=4)
+    calls = []
+    async def _handler(zone_id, value):
+      # later calls finishing first would reorder them without per-key ordering
+      await asyncio.sleep(0.01 if value == 0 else 0)
+      calls.append((zone_id, value))
+    for value in range(5):
+      for zone_id in range(3):
+        dispatcher.dispatch(('zone', zone_id), [_handler], zone_id, value)
+    await dispatcher.join()
+    for zone_id in range(3):
+      self.assertEqual([v for z, v in calls if z == zone_id], list(range(5)))
+    self.assertEqual(dispatcher.stats['dispatched'], 15)
+    await dispatcher.close()
+
+  async def test_drop_oldest(self):
+    dispatcher = HandlerDispatcher(workers=1, queue_size=2, overflow=OVERFLOW_DROP_OLDEST)
+    calls = []
+    async def _handler(value):
+      calls.append(value)
+    for value in range(5):
+      dispatcher.dispatch('key', [_handler], value)
+    await dispatcher.join()
+    self.assertEqual(calls, [3, 4])
+    self.assertEqual(dispatcher.stats['dropped'], 3)
+    await dispatcher.close()
+
+  async def test_drop_only_coalesces_the_same_key(self):
+    dispatcher = HandlerDispatcher(workers=1, queue_size=2, overflow=OVERFLOW_DROP_OLDEST)
+    calls = []
+    async def _handler(key, value):
+      calls.append((key, value))
+    dispatcher.dispatch('a', [_handler], 'a', 0)
+    dispatcher.dispatch('b', [_handler], 'b', 0)
+    dispatcher.dispatch('c', [_handler], 'c', 0)
+    dispatcher.dispatch('b', [_handler], 'b', 1)
+    await dispatcher.join()
+    self.assertEqual(calls, [('a', 0), ('c', 0), ('b', 1)])
+    self.assertEqual(dispatcher.stats['dropped'], 1)
+    await dispatcher.close()
+
+  async def test_drop_newest(self):
+    dispatcher = HandlerDispatcher(workers=1, queue_size=2, overflow=OVERFLOW_DROP_NEWEST)
+    calls = []
+    async def _handler(value):
+      calls.append(value)
+    for value in range(5):
+      dispatcher.dispatch('key', [_handler], value)
+    await dispatcher.join()
+    self.assertEqual(calls, [0, 1])
+    await dispatcher.close()
+
+  async def test_block_waits_for_room(self):
+    dispatcher = HandlerDispatcher(workers=1, queue_size=2)
+    calls = []
+    async def _handler(value):
+      calls.append(value)
+    for value in range(3):
+      dispatcher.dispatch('key', [_handler], value)
+    self.assertEqual(dispatcher.stats['pending'], 3)
+    await dispatcher.wait_for_room()
+    await dispatcher.join()
+    self.assertEqual(calls, [0, 1, 2])
+    await dispatcher.close()
+
+  async def test_close_cancels_hung_handlers(self):
+    dispatcher = HandlerDispatcher(workers=1)
+    cancelled = asyncio.Event()
+    calls = []
+    async def _hung():
+      try:
+        await asyncio.sleep(10)
+      except asyncio.CancelledError:
+        cancelled.set()
+        raise
+    async def _handler():
+      calls.append(1)
+    dispatcher.dispatch('key', [_hung])
+    dispatcher.dispatch('key', [_handler])
+    await asyncio.wait_for(dispatcher.close(timeout=0.05), 1)
+    await asyncio.wait_for(cancelled.wait(), 1)
+    self.assertEqual(calls, [])
+    self.assertEqual(dispatcher.stats['dropped'], 1)
+    self.assertEqual(dispatcher.stats['pending'], 0)
+
+  async def test_batch_handler(self):
+    dispatcher = HandlerDispatcher()
+    batches = []
+    async def _batch(changes):
+      batches.append(changes)
+    dispatcher.add_batch_handler(_batch)
+    dispatcher.dispatch(('zone', 1), [], 1, 'a')
+    dispatcher.dispatch(('zone', 2), [], 2, 'b')
+    await asyncio.sleep(0)
+    await dispatcher.join()
+    self.assertEqual(batches, [[(('zone', 1), (1, 'a')), (('zone', 2), (2, 'b'))]])
+    await dispatcher.close()
+
+  async def test_errors_and_slow_handlers_are_reported(self):
+    errors = []
+    dispatcher = HandlerDispatcher(on_error=lambda key, error: errors.append((key, error)))
+    async def _failing():
+      raise ValueError('boom')
+    async def _slow():
+      await asyncio.sleep(0.02)
+    with patch('pyrisco.local.dispatcher.SLOW_HANDLER_THRESHOLD', 0.01):
+      dispatcher.dispatch('key', [_failing, _slow])
+      await dispatcher.join()
+    self.assertEqual(errors[0][0], 'key')
+    self.assertIsInstance(errors[0][1], ValueError)
+    self.assertEqual(list(dispatcher.stats['slow_handlers'].values()), [1])
+    await dispatcher.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from pyrisco.local.event import EventLog, parse_event
+
+
+class TestEvent(unittest.TestCase):
+
+  def test_parse_event(self):
+    event = parse_event('12/05/2024 20:37 Zone 012 Bypass Front door')
+    self.assertEqual((event.time, event.type_name, event.zone_id, event.partition_id, event.user_id),
+                     ('12/05/2024 20:37', 'zone bypassed', 12, None, None))
+    event = parse_event('12/05 08:01 Partition 2 Disarm User 03')
+    self.assertEqual((event.time, event.type_name, event.zone_id, event.partition_id, event.user_id),
+                     ('12/05 08:01', 'disarmed', None, 2, 3))
+    event = parse_event('Something else')
+    self.assertEqual((event.time, event.type_name, event.zone_id), (None, 'unknown', None))
+    self.assertEqual(event.raw, 'Something else')
+
+  def test_event_types(self):
+    for text, type_name in [
+      ('12/05 20:37 Zone 3 Alarm', 'alarm'),
+      ('Partition 1 Alarm', 'alarm'),
+      ('Zone 4 Tamper Alarm', 'tamper'),
+      ('Fire alarm zone 5', 'fire'),
+      ('Partition 1 Armed User 2', 'armed'),
+      ('Partition 1 Arm', 'armed'),
+      ('Partition 2 Disarm', 'disarmed'),
+      ('Group Arm A', 'group arm'),
+      ('Zone 1 Unbypass', 'zone unbypassed'),
+    ]:
+      self.assertEqual(parse_event(text).type_name, type_name, text)
+
+  def test_event_log(self):
+    log = EventLog(4)
+    for text in ['Zone 1 Open', 'Zone 2 Open', 'Zone 1 Restore', 'Partition 1 Arm', 'Zone 1 Bypass', 'Zone 3 Open']:
+      log.append(parse_event(text))
+    self.assertEqual(len(log), 4)
+    self.assertEqual([e.raw for e in log.events(2)], ['Zone 3 Open', 'Zone 1 Bypass'])
+    self.assertEqual([e.raw for e in log.for_zone(1)], ['Zone 1 Bypass', 'Zone 1 Restore'])
+    self.assertEqual([e.raw for e in log.for_zone(1, 1)], ['Zone 1 Bypass'])
+    self.assertEqual(log.for_zone(2), [])
+    self.assertEqual([e.raw for e in log.for_partition(1)], ['Partition 1 Arm'])
+    self.assertEqual([e.raw for e in log.for_type('triggered')], ['Zone 3 Open'])
+    self.assertNotIn(2, log._by_zone)
+
+
+if __name__ == '__main__':
+  unittest.main()
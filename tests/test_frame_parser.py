@@ -0,0 +1,56 @@
+import unittest
+from pyrisco.local.frame_parser import FrameParser
+from pyrisco.local.risco_crypt import RiscoCrypt
+
+
+class TestFrameParser(unittest.TestCase):
+
+  def test_single_frame(self):
+    parser = FrameParser()
+    self.assertEqual(parser.feed(b'\x0201ACK\x17ABCD\x03'), [b'\x0201ACK\x17ABCD\x03'])
+
+  def test_back_to_back_frames(self):
+    parser = FrameParser()
+    frames = parser.feed(b'\x02first\x03\x02second\x03\x02thi')
+    self.assertEqual(frames, [b'\x02first\x03', b'\x02second\x03'])
+    self.assertEqual(parser.feed(b'rd\x03'), [b'\x02third\x03'])
+
+  def test_byte_by_byte(self):
+    parser = FrameParser()
+    stream = b'\x02a\x10\x03b\x10\x10\x03'
+    frames = []
+    for i in range(len(stream)):
+      frames += parser.feed(stream[i:i+1])
+    self.assertEqual(frames, [stream])
+
+  def test_escaped_dle_before_end(self):
+    parser = FrameParser()
+    self.assertEqual(parser.feed(b'\x02a\x10\x10'), [])
+    self.assertEqual(parser.feed(b'\x03\x02b\x03'), [b'\x02a\x10\x10\x03', b'\x02b\x03'])
+
+  def test_escaped_end_split_across_reads(self):
+    parser = FrameParser()
+    self.assertEqual(parser.feed(b'\x02a\x10'), [])
+    self.assertEqual(parser.feed(b'\x03'), [])
+    self.assertEqual(parser.feed(b'b\x03'), [b'\x02a\x10\x03b\x03'])
+
+  def test_discards_garbage_and_truncated_frames(self):
+    parser = FrameParser()
+    self.assertEqual(parser.feed(b'junk\x02cut\x02whole\x03junk'), [b'\x02whole\x03'])
+    self.assertEqual(parser.feed(b'\x02next\x03'), [b'\x02next\x03'])
+
+  def test_encrypted_frames_decode(self):
+    crypt = RiscoCrypt()
+    crypt.set_panel_id(0x1234)
+    frames = [crypt.encode(i, f'ZSTT{i}=--------O-----------', True) for i in range(1, 40)]
+    parser = FrameParser()
+    stream = b''.join(frames)
+    parsed = []
+    for i in range(0, len(stream), 7):
+      parsed += parser.feed(stream[i:i+7])
+    self.assertEqual(parsed, frames)
+    self.assertEqual(crypt.decode(parsed[11]), [12, 'ZSTT12=--------O-----------', True])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,48 @@
+import copy
+import unittest
+from pyrisco.local.partition import Partition
+from pyrisco.local.system import System
+from pyrisco.local.zone import Zone, TRIGGERED, ALARMED, ARMED, BYPASSED, LOW_BATTERY
+
+
+class TestLocalModels(unittest.TestCase):
+
+  def test_zone_status(self):
+    zone = Zone(None, 3, '--O-A-Y-b---', 3, ' Door ', '12', '5', 'W')
+    self.assertEqual(zone.name, 'Door')
+    self.assertTrue(zone.triggered and zone.armed and zone.bypassed and zone.low_battery)
+    self.assertFalse(zone.alarmed)
+    self.assertEqual(zone.partitions, [1, 6])
+    self.assertEqual(zone.groups, ['A', 'C'])
+    self.assertEqual(zone.update_status('-a----------'), TRIGGERED | ALARMED | ARMED | BYPASSED | LOW_BATTERY)
+    self.assertIsNone(zone.update_status('-a----------'))
+    # the raw status changed, but no known flag did
+    self.assertEqual(zone.update_status('-a---------N'), 0)
+    self.assertTrue(zone.alarmed)
+    self.assertFalse(zone.triggered or zone.armed or zone.bypassed or zone.low_battery)
+
+  def test_partition_status(self):
+    partition = Partition(None, 1, 'Home', '-E-H-R-2')
+    self.assertTrue(partition.partially_armed and partition.ready)
+    self.assertFalse(partition.armed or partition.disarmed or partition.triggered)
+    self.assertEqual(partition.groups, {'A': False, 'B': True, 'C': False, 'D': False})
+    partition.update_status('-E---')
+    self.assertTrue(partition.disarmed)
+
+  def test_system_status(self):
+    system = System(None, 'House', '-BI-X')
+    self.assertTrue(system.low_battery_trouble and system.programming_mode and system.box_tamper)
+    self.assertFalse(system.ac_trouble or system.clock_trouble or system.monitoring_station_1_trouble)
+
+  def test_models_are_slotted(self):
+    zone = Zone(None, 1, '----', 3, 'Door', '1', '0', 'W')
+    with self.assertRaises(AttributeError):
+      zone.extra = True
+    snapshot = copy.copy(zone)
+    zone.update_status('O---')
+    self.assertFalse(snapshot.triggered)
+    self.assertTrue(zone.triggered)
+
+
+if __name__ == '__main__':
+  unittest.main()
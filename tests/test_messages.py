@@ -0,0 +1,29 @@
+import unittest
+from pyrisco.local.messages import MessageRouter, parse_message
+
+
+class TestMessages(unittest.TestCase):
+
+  def test_parse_message(self):
+    message = parse_message('ZSTT12=--O-')
+    self.assertEqual((message.command, message.prefix, message.entity_id, message.value), ('ZSTT12', 'ZSTT', 12, '--O-'))
+    message = parse_message('EVENT=01/02 10:00 Zone 3 = open')
+    self.assertEqual((message.prefix, message.entity_id, message.value), ('EVENT', None, '01/02 10:00 Zone 3 = open'))
+    self.assertEqual(parse_message('ABC=1=2').fields, ['1', '2'])
+
+  def test_router(self):
+    routed = []
+    router = MessageRouter(lambda message: routed.append(('default', message.command)))
+    remove = router.add_route('PSTT', lambda message: routed.append(('partition', message.entity_id)))
+    with self.assertRaises(ValueError):
+      router.add_route('PSTT', print)
+    router.route('PSTT2=A')
+    router.route('OSTT2=1')
+    remove()
+    router.route('PSTT3=A')
+    self.assertEqual(routed, [('partition', 2), ('default', 'OSTT2'), ('default', 'PSTT3')])
+    self.assertNotIn('PSTT', router)
+
+
+if __name__ == '__main__':
+  unittest.main()
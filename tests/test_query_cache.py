@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+from pyrisco.common import OperationError
+from pyrisco.local.query_cache import QueryCache
+
+
+class TestQueryCache(unittest.IsolatedAsyncioTestCase):
+
+  def setUp(self):
+    self.sent = []
+
+  async def _fetch(self, value, delay=0.01):
+    self.sent.append(value)
+    await asyncio.sleep(delay)
+    return value
+
+  async def test_concurrent_queries_share_one_request(self):
+    cache = QueryCache()
+    results = await asyncio.gather(*[cache.get('ZLBL*1?', lambda: self._fetch('Door')) for i in range(5)])
+    self.assertEqual(results, ['Door'] * 5)
+    self.assertEqual(self.sent, ['Door'])
+    self.assertEqual((cache.misses, cache.shared), (1, 4))
+    # without a ttl, nothing is kept
+    await cache.get('ZLBL*1?', lambda: self._fetch('Door'))
+    self.assertEqual(len(self.sent), 2)
+
+  async def test_ttl_and_invalidation(self):
+    cache = QueryCache(ttl=60)
+    self.assertTrue(cache.cacheable('ZLBL*1?'))
+    self.assertFalse(cache.cacheable('ZSTT*1?'))
+    await cache.get('ZLBL*1?', lambda: self._fetch('Door'))
+    await cache.get('ZLBL*10?', lambda: self._fetch('Garage'))
+    self.assertEqual(await cache.get('ZLBL*1?', lambda: self._fetch('Other')), 'Door')
+    self.assertEqual(cache.hits, 1)
+    cache.invalidate('ZLBL*1=Front door')
+    self.assertEqual(await cache.get('ZLBL*1?', lambda: self._fetch('Front door')), 'Front door')
+    self.assertEqual(await cache.get('ZLBL*10?', lambda: self._fetch('Other')), 'Garage')
+
+  async def test_reply_in_flight_during_write_is_not_cached(self):
+    cache = QueryCache(ttl=60)
+    stale = asyncio.create_task(cache.get('PLBL1?', lambda: self._fetch('Old')))
+    await asyncio.sleep(0)
+    cache.invalidate('PLBL1=New')
+    self.assertEqual(await cache.get('PLBL1?', lambda: self._fetch('New')), 'New')
+    self.assertEqual(await stale, 'Old')
+    self.assertEqual(await cache.get('PLBL1?', lambda: self._fetch('Other')), 'New')
+
+  async def test_errors_are_shared_and_not_cached(self):
+    cache = QueryCache(ttl=60)
+    async def _fail():
+      await asyncio.sleep(0.01)
+      raise OperationError('Timeout')
+    results = await asyncio.gather(*[cache.get('SYSLBL?', _fail) for i in range(2)], return_exceptions=True)
+    self.assertTrue(all(isinstance(r, OperationError) for r in results))
+    self.assertEqual(await cache.get('SYSLBL?', lambda: self._fetch('House')), 'House')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from pyrisco.local.risco_crypt import RiscoCrypt, ENCRYPTED_START, END, _escape
+
+
+def _reference_xor(crypt, chars):
+  return bytes(c ^ crypt._pseudo_buffer[i] for i, c in enumerate(chars))
+
+
+class TestRiscoCrypt(unittest.TestCase):
+
+  def test_xor_matches_reference(self):
+    payload = bytes(range(256))[:255]
+    for panel_id in [0, 1, 0x10, 0x1234, 0xFFFF]:
+      crypt = RiscoCrypt()
+      crypt.set_panel_id(panel_id)
+      for length in [0, 1, 17, 254, 255]:
+        self.assertEqual(crypt._xor(payload[:length]), _reference_xor(crypt, payload[:length]))
+
+  def test_pseudo_buffer_shared_between_connections(self):
+    first = RiscoCrypt()
+    first.set_panel_id(0x4321)
+    second = RiscoCrypt()
+    second.set_panel_id(0x4321)
+    self.assertIs(first._pseudo_buffer, second._pseudo_buffer)
+    self.assertEqual(len(first._pseudo_buffer), 255)
+
+  def test_encode_decode_roundtrip(self):
+    crypt = RiscoCrypt()
+    crypt.set_panel_id(0x1234)
+    for force_crypt in [False, True]:
+      frame = crypt.encode(7, 'ZLBL*12?', force_crypt)
+      self.assertEqual(crypt.decode(bytes(frame)), [7, 'ZLBL*12?', True])
+      self.assertEqual(crypt.encrypted_panel, force_crypt)
+
+  def test_decode_error_reply(self):
+    crypt = RiscoCrypt()
+    crypt.set_panel_id(0x1234)
+    # an error reply has no command id
+    body = b'N05\x17' + crypt._get_crc(b'N05\x17')
+    frame = ENCRYPTED_START + _escape(crypt._xor(body)) + END
+    self.assertEqual(crypt.decode(frame), [None, 'N05', True])
+
+  def test_decode_escaped_control_bytes(self):
+    crypt = RiscoCrypt()
+    crypt.set_panel_id(0)
+    command = 'LBL=\x10\x02\x03\x10'
+    frame = crypt.encode(3, command)
+    self.assertNotIn(b'\x03', frame[1:-1].replace(b'\x10\x03', b''))
+    self.assertEqual(crypt.decode(memoryview(frame)), [3, command, True])
+
+  def test_decode_wrong_crc(self):
+    crypt = RiscoCrypt()
+    crypt.set_panel_id(0)
+    frame = b'\x0201CLOCK\x170000\x03'
+    self.assertEqual(crypt.decode(frame), [1, 'CLOCK', False])
+
+  def test_crc(self):
+    crypt = RiscoCrypt()
+    self.assertEqual(crypt._get_crc(b'01RID\x17'), crypt._get_crc(bytearray(b'01RID\x17')))
+    self.assertRegex(crypt._get_crc(b'01RID\x17'), b'^[0-9A-F]{4}$')
+
+
+if __name__ == '__main__':
+  unittest.main()
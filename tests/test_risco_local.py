@@ -0,0 +1,387 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from fake_panel import FakePanel, panel_responses
+from pyrisco.local.panel_cache import PanelCache
+from pyrisco.local.risco_local import RiscoLocal
+from pyrisco.local.zone import BYPASSED
+
+ZONES = {
+  1: (3, 'Front door', '------------', '1'),
+  2: (3, 'Hallway', '-----O------', '1'),
+  7: (5, 'Garage', '------------', '2'),
+}
+PARTITIONS = {
+  1: ('House', '-----RE---'),
+  2: ('Garage', '-----E----'),
+}
+
+
+class TestRiscoLocal(unittest.IsolatedAsyncioTestCase):
+
+  async def asyncSetUp(self):
+    self.panel = FakePanel(panel_responses(zones=ZONES, partitions=PARTITIONS))
+    await self.panel.start()
+    self.cache_dir = tempfile.TemporaryDirectory()
+
+  async def asyncTearDown(self):
+    await self.panel.stop()
+    self.cache_dir.cleanup()
+
+  async def _connect(self, **kwargs):
+    kwargs.setdefault('reconnect_cooldown', 0)
+    r = RiscoLocal('127.0.0.1', self.panel.port, '1234', **kwargs)
+    await r.connect()
+    return r
+
+  async def _disconnect(self, r):
+    await r.disconnect()
+
+  async def test_connect_discovers_panel(self):
+    r = await self._connect()
+    try:
+      self.assertEqual(r.id, '00012345')
+      self.assertEqual(sorted(r.zones), [1, 2, 7])
+      self.assertEqual(r.zones[2].name, 'Hallway')
+      self.assertTrue(r.zones[2].triggered)
+      self.assertEqual(r.zones[7].partitions, [2])
+      self.assertEqual(sorted(r.partitions), [1, 2])
+      self.assertTrue(r.partitions[1].ready)
+      self.assertEqual(r.system.name, 'Home')
+    finally:
+      await self._disconnect(r)
+
+  async def test_status_push_calls_handlers(self):
+    r = await self._connect()
+    updates = asyncio.Queue()
+    async def _zone(zone_id, zone):
+      await updates.put((zone_id, zone.triggered))
+    async def _partition(partition_id, partition):
+      await updates.put((partition_id, partition.armed))
+    r.add_zone_handler(_zone)
+    r.add_partition_handler(_partition)
+    seq = r.state.seq
+    try:
+      self.panel.push('ZSTT2=------------')
+      self.panel.push('PSTT1=---A-RE---')
+      received = {await asyncio.wait_for(updates.get(), 1) for i in range(2)}
+      self.assertEqual(received, {(2, False), (1, True)})
+      self.assertFalse(r.zones[2].triggered)
+      self.assertEqual(r.dispatch_stats['dispatched'], 2)
+      changes = r.state.changes_since(seq)
+      self.assertEqual(sorted((kind, i) for s, kind, i, entity in changes), [('partition', 1), ('zone', 2)])
+      self.assertTrue(r.state.snapshot().partitions[1].armed)
+    finally:
+      await self._disconnect(r)
+
+  async def test_repeated_status_is_suppressed(self):
+    r = await self._connect()
+    updates = asyncio.Queue()
+    bypasses = asyncio.Queue()
+    async def _zone(zone_id, zone):
+      await updates.put((zone_id, zone.triggered))
+    async def _bypass(zone_id, zone):
+      await bypasses.put((zone_id, zone.bypassed))
+    r.add_zone_handler(_zone)
+    r.add_zone_handler(_bypass, mask=BYPASSED)
+    try:
+      # the last one changes the raw status, but none of the known flags
+      for status in ['-----O------', '------------', '------------', '---Y--------', '---Y-------N']:
+        self.panel.push(f'ZSTT2={status}')
+      for i in range(3):
+        self.assertEqual(await asyncio.wait_for(updates.get(), 1), (2, False))
+      self.assertEqual(await asyncio.wait_for(bypasses.get(), 1), (2, True))
+      self.assertEqual(r.update_stats, {'delivered': 3, 'suppressed': 2})
+      self.assertTrue(updates.empty() and bypasses.empty())
+    finally:
+      await self._disconnect(r)
+
+  async def test_auto_reconnect_reconciles_status(self):
+    r = await self._connect(auto_reconnect=True, reconnect_initial_delay=0.01)
+    zone = r.zones[2]
+    updates = asyncio.Queue()
+    async def _zone(zone_id, zone):
+      await updates.put((zone_id, zone.triggered))
+    r.add_zone_handler(_zone)
+    try:
+      self.panel.responses['ZSTT*2?'] = 'ZSTT*2=------------'
+      received = len(self.panel.received)
+      self.panel.drop()
+      self.assertEqual(await asyncio.wait_for(updates.get(), 1), (2, False))
+      self.assertIs(r.zones[2], zone)
+      self.assertNotIn('ZTYPE*1?', self.panel.received[received:])
+      stats = r.reconnect_stats
+      self.assertEqual(stats['reconnects'], 1)
+      self.assertGreater(stats['recovery_time'], 0)
+      # the reconciled entities that didn't change are not reported
+      self.assertEqual(r.update_stats, {'delivered': 1, 'suppressed': 5})
+      self.assertTrue(updates.empty())
+    finally:
+      await self._disconnect(r)
+
+  async def test_reconcile_is_not_overwritten_by_older_push(self):
+    r = await self._connect(auto_reconnect=True, reconnect_initial_delay=0.01)
+    reconnected = asyncio.Event()
+    def _status(command):
+      # the push was sent before the reply, so the reply is newer
+      self.panel.push('ZSTT2=-----O------')
+      loop.call_soon(reconnected.set)
+      return 'ZSTT*2=------------'
+    loop = asyncio.get_running_loop()
+    self.panel.responses['ZSTT*2?'] = _status
+    try:
+      self.panel.push('ZSTT2=------------')
+      await asyncio.sleep(0.05)
+      self.panel.drop()
+      await asyncio.wait_for(reconnected.wait(), 1)
+      await asyncio.sleep(0.05)
+      self.assertFalse(r.zones[2].triggered)
+    finally:
+      await self._disconnect(r)
+
+  async def test_reconnect_survives_unexpected_errors(self):
+    r = await self._connect(auto_reconnect=True, reconnect_initial_delay=0.01)
+    errors = asyncio.Queue()
+    async def _error(error):
+      await errors.put(error)
+    r.add_error_handler(_error)
+    reconcile = r._reconcile
+    async def _failing_once():
+      r._reconcile = reconcile
+      raise IndexError('list index out of range')
+    r._reconcile = _failing_once
+    try:
+      self.panel.drop()
+      self.assertIsInstance(await asyncio.wait_for(errors.get(), 1), ConnectionResetError)
+      self.assertIsInstance(await asyncio.wait_for(errors.get(), 1), IndexError)
+      for i in range(100):
+        if r.reconnect_stats['reconnects']:
+          break
+        await asyncio.sleep(0.01)
+      self.assertEqual(r.reconnect_stats['reconnects'], 1)
+    finally:
+      await self._disconnect(r)
+
+  async def test_bulk_bypass_and_arm(self):
+    r = await self._connect(arm_timeout=0.05)
+    loop = asyncio.get_running_loop()
+    def _toggle(zone_id, status):
+      def _respond(command):
+        loop.call_later(0.01, self.panel.push, f'ZSTT{zone_id}={status}')
+        return 'ACK'
+      return _respond
+    def _arm(command):
+      # the push comes before the reply
+      self.panel.push('PSTT1=---A-RE---')
+      return 'ACK'
+    self.panel.responses.update({
+      'ZBYPAS=1': _toggle(1, '---Y--------'),
+      # bypassed, but no push told us
+      'ZSTT*7?': 'ZSTT*7=---Y--------',
+      'ARM=1': _arm,
+      'ARM=2': 'ACK',
+    })
+    try:
+      results = await r.bypass_zones({1: True, 2: False, 7: True})
+      self.assertEqual(results, {1: True, 2: True, 7: True})
+      self.assertTrue(r.zones[1].bypassed)
+      # every status is read before any zone is toggled, and only where needed
+      sent = [c for c in self.panel.received if c.startswith(('ZSTT*', 'ZBYPAS'))][-4:]
+      self.assertEqual(sorted(sent[:3]), ['ZSTT*1?', 'ZSTT*2?', 'ZSTT*7?'])
+      self.assertEqual(sent[3], 'ZBYPAS=1')
+      self.assertEqual(await r.arm_partitions([1, 2]), {1: True, 2: False})
+      with self.assertRaises(ValueError):
+        await r.arm_partitions([1], 'unknown')
+    finally:
+      await self._disconnect(r)
+
+  async def test_events_are_parsed_and_kept(self):
+    r = await self._connect()
+    events = asyncio.Queue()
+    async def _event(event):
+      await events.put(event)
+    r.add_event_handler(_event, parsed=True)
+    try:
+      self.panel.push('EVENT=12/05/2024 20:37 Zone 7 Open Garage')
+      event = await asyncio.wait_for(events.get(), 1)
+      self.assertEqual((event.zone_id, event.type_name), (7, 'triggered'))
+      self.assertEqual(r.events.for_zone(7), [event])
+    finally:
+      await self._disconnect(r)
+
+  async def test_message_handlers(self):
+    r = await self._connect()
+    messages = asyncio.Queue()
+    defaults = asyncio.Queue()
+    async def _output(message):
+      await messages.put(message)
+    async def _default(command, result, *params):
+      await defaults.put((command, result, params))
+    r.add_message_handler('OSTT', _output)
+    r.add_default_handler(_default)
+    with self.assertRaises(ValueError):
+      r.add_message_handler('ZSTT', _output)
+    try:
+      self.panel.push('OSTT3=1')
+      self.panel.push('OTHER=2=3')
+      message = await asyncio.wait_for(messages.get(), 1)
+      self.assertEqual((message.prefix, message.entity_id, message.value), ('OSTT', 3, '1'))
+      self.assertEqual(await asyncio.wait_for(defaults.get(), 1), ('OTHER', '2', ('3',)))
+      self.assertTrue(defaults.empty())
+    finally:
+      await self._disconnect(r)
+
+  async def test_connect_discovers_lightsys(self):
+    self.panel.responses.update(panel_responses('RP432', '3.0', 50, 4, ZONES, PARTITIONS))
+    self.panel.responses['ZLNKTYP2?'] = 'ZLNKTYP2=N'
+    r = await self._connect()
+    try:
+      self.assertEqual(sorted(r.zones), [1, 7])
+      self.assertEqual(r.zones[1].groups, ['A'])
+      self.assertFalse(any(c in self.panel.received for c in ['ZLBL*2?', 'ZLNKTYP3?', 'ZSTT*3?']))
+    finally:
+      await self._disconnect(r)
+
+  async def test_progressive_connect(self):
+    release = asyncio.Event()
+    async def _label(command):
+      await release.wait()
+      return 'ZLBL*7=Garage'
+    self.panel.responses['ZLBL*7?'] = _label
+    r = RiscoLocal('127.0.0.1', self.panel.port, '1234')
+    discovered = []
+    async def _discovered(zone_id, zone):
+      discovered.append(zone_id)
+    r.add_zone_discovered_handler(_discovered)
+    await r.connect(progressive=True)
+    try:
+      self.assertEqual(sorted(r.partitions), [1, 2])
+      iterated = []
+      async for zone in r.discovered_zones():
+        iterated.append(zone.id)
+        if len(iterated) == 2:
+          break
+      self.assertEqual(sorted(iterated), [1, 2])
+      self.assertNotIn(7, r.zones)
+
+      # its status was read already, but it changes before the zone exists
+      self.panel.push('ZSTT7=---Y--------')
+      await asyncio.sleep(0.05)
+      release.set()
+      await r.wait_for_zones()
+      self.assertTrue(r.zones[7].bypassed)
+      self.assertEqual([z.id async for z in r.discovered_zones()][-1], 7)
+      await asyncio.sleep(0)
+      self.assertEqual(sorted(discovered), [1, 2, 7])
+    finally:
+      await self._disconnect(r)
+
+  async def test_discovered_status_is_not_overwritten_by_older_push(self):
+    def _status(command):
+      # the push was sent before the reply, so the reply is newer
+      self.panel.push('ZSTT7=---Y--------')
+      return 'ZSTT*7=------------'
+    self.panel.responses['ZSTT*7?'] = _status
+    for progressive, coalesce_status in [(False, False), (False, True), (True, False)]:
+      r = RiscoLocal('127.0.0.1', self.panel.port, '1234', coalesce_status=coalesce_status, reconnect_cooldown=0)
+      await r.connect(progressive=progressive)
+      try:
+        await r.wait_for_zones()
+        # once this is applied, so is everything queued before it
+        self.panel.push('ZSTT1=-----O------')
+        for i in range(100):
+          if r.zones[1].triggered:
+            break
+          await asyncio.sleep(0.01)
+        self.assertFalse(r.zones[7].bypassed)
+        self.panel.push('ZSTT7=---Y--------')
+        for i in range(100):
+          if r.zones[7].bypassed:
+            break
+          await asyncio.sleep(0.01)
+        self.assertTrue(r.zones[7].bypassed)
+      finally:
+        await self._disconnect(r)
+
+  async def test_connect_from_cache(self):
+    r = await self._connect(cache_dir=self.cache_dir.name)
+    await self._disconnect(r)
+    self.panel.received.clear()
+
+    r = await self._connect(cache_dir=self.cache_dir.name)
+    received = list(self.panel.received)
+    try:
+      self.assertFalse(any(c.startswith(('ZLBL', 'PLBL', 'SYSLBL')) for c in received))
+      # only the cached zones are validated before connect() returns
+      self.assertEqual(sorted(c for c in received if c.startswith('ZTYPE')), ['ZTYPE*1?', 'ZTYPE*2?', 'ZTYPE*7?'])
+      self.assertEqual(sorted(r.zones), [1, 2, 7])
+      self.assertEqual(r.zones[1].name, 'Front door')
+      self.assertEqual(r.zones[7].partitions, [2])
+      self.assertEqual(r.partitions[2].name, 'Garage')
+      self.assertEqual(r.system.name, 'Home')
+    finally:
+      await self._disconnect(r)
+
+  async def test_cache_invalidated_when_zone_removed(self):
+    r = await self._connect(cache_dir=self.cache_dir.name)
+    await self._disconnect(r)
+    self.panel.responses.update({'ZTYPE*7?': 'ZTYPE*7=0', 'ZSTT*7?': 'ZSTT*7=----------N'})
+
+    r = await self._connect(cache_dir=self.cache_dir.name)
+    try:
+      self.assertEqual(sorted(r.zones), [1, 2])
+    finally:
+      await self._disconnect(r)
+
+  async def test_cache_invalidated_when_zone_type_changed(self):
+    r = await self._connect(cache_dir=self.cache_dir.name)
+    await self._disconnect(r)
+    self.panel.responses['ZTYPE*7?'] = 'ZTYPE*7=9'
+
+    r = await self._connect(cache_dir=self.cache_dir.name)
+    try:
+      self.assertEqual(r.zones[7].type, 9)
+    finally:
+      await self._disconnect(r)
+
+  async def test_cache_refreshed_in_background(self):
+    r = await self._connect(cache_dir=self.cache_dir.name)
+    await self._disconnect(r)
+    zones = {**ZONES, 1: (3, 'Entrance', '------------', '1'), 4: (3, 'Kitchen', '------------', '1')}
+    self.panel.responses.update(panel_responses(zones=zones, partitions=PARTITIONS))
+
+    r = await self._connect(cache_dir=self.cache_dir.name)
+    try:
+      self.assertEqual(sorted(r.zones), [1, 2, 7])
+      await r._cache_check_task
+      self.assertEqual(sorted(r.zones), [1, 2, 4, 7])
+    finally:
+      await self._disconnect(r)
+
+    self.panel.received.clear()
+    r = await self._connect(cache_dir=self.cache_dir.name)
+    try:
+      self.assertFalse(any(c.startswith('ZLBL') for c in self.panel.received))
+      self.assertEqual(sorted(r.zones), [1, 2, 4, 7])
+      self.assertEqual(r.zones[1].name, 'Entrance')
+    finally:
+      await self._disconnect(r)
+
+  async def test_disconnect_waits_for_cache_save(self):
+    save = PanelCache._save
+    def _slow_save(cache, key, data):
+      time.sleep(0.2)
+      save(cache, key, data)
+    r = RiscoLocal('127.0.0.1', self.panel.port, '1234', cache_dir=self.cache_dir.name, reconnect_cooldown=0)
+    with patch.object(PanelCache, '_save', _slow_save):
+      await r.connect(progressive=True)
+      await r.wait_for_zones()
+      await self._disconnect(r)
+    self.assertEqual(len(os.listdir(self.cache_dir.name)), 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,250 @@
+import asyncio
+import time
+import unittest
+from collections import deque
+from fake_panel import FakePanel
+from pyrisco.common import OperationError
+from pyrisco.local.frame_parser import FrameParser
+from pyrisco.local.risco_crypt import RiscoCrypt
+from pyrisco.local.risco_socket import RiscoSocket, TRANSPORT_STREAM, TRANSPORT_PROTOCOL
+
+
+def _make_socket():
+  rs = RiscoSocket('127.0.0.1', 1000, '1234')
+  rs._crypt = RiscoCrypt()
+  rs._crypt.set_panel_id(0x1234)
+  rs._parser = FrameParser()
+  rs._frames = deque()
+  return rs
+
+
+async def _wait_until(predicate, timeout=1):
+  async def _poll():
+    while not predicate():
+      await asyncio.sleep(0.01)
+  await asyncio.wait_for(_poll(), timeout)
+
+
+class TestRiscoSocket(unittest.IsolatedAsyncioTestCase):
+
+  async def test_read_command_handles_split_frames(self):
+    rs = _make_socket()
+    rs._reader = asyncio.StreamReader()
+    stream = rs._crypt.encode(51, 'ZSTT3=O', True) + rs._crypt.encode(52, 'PSTT1=R', True)
+    rs._reader.feed_data(stream[:5])
+    rs._reader.feed_data(stream[5:])
+    rs._reader.feed_eof()
+    self.assertEqual(await rs._read_command(), [51, 'ZSTT3=O', True])
+    self.assertEqual(await rs._read_command(), [52, 'PSTT1=R', True])
+    with self.assertRaises(ConnectionResetError):
+      await rs._read_command()
+
+
+class TestRiscoSocketTransports(unittest.IsolatedAsyncioTestCase):
+
+  async def asyncSetUp(self):
+    self.panel = FakePanel({'PNLCNF': 'PNLCNF=RP432MP'})
+    await self.panel.start()
+
+  async def asyncTearDown(self):
+    await self.panel.stop()
+
+  async def _check_transport(self, transport):
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234', transport=transport)
+    await rs.connect()
+    try:
+      self.assertEqual(await rs.send_result_command('PNLCNF'), 'RP432MP')
+      with self.assertRaises(OperationError):
+        await rs.send_result_command('UNKNOWN?')
+      self.panel.push('ZSTT3=O')
+      self.assertEqual(await asyncio.wait_for(rs.queue.get(), 1), 'ZSTT3=O')
+      await _wait_until(lambda: 'ACK' in self.panel.received)
+    finally:
+      await rs.disconnect()
+    self.assertEqual(self.panel.received[-1], 'DCN')
+
+  async def test_stream_transport(self):
+    await self._check_transport(TRANSPORT_STREAM)
+
+  async def test_protocol_transport(self):
+    await self._check_transport(TRANSPORT_PROTOCOL)
+
+  async def test_writes_are_coalesced(self):
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234')
+    await rs.connect()
+    try:
+      writes = rs.write_stats['writes']
+      results = await asyncio.gather(*[rs.send_result_command('CLOCK') for i in range(4)])
+      self.assertEqual(len(results), 4)
+      stats = rs.write_stats
+      self.assertEqual(stats['writes'], writes + 1)
+      self.assertGreater(stats['frames_per_write'], 1)
+      self.assertGreater(stats['bytes_written'], 0)
+    finally:
+      await rs.disconnect()
+
+  async def test_late_reply_does_not_resolve_newer_command(self):
+    late = []
+    def _hold(command):
+      late.append(command)
+      return None
+    self.panel.responses['SLOW?'] = _hold
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234', concurrency=49)
+    await rs.connect()
+    try:
+      with self.assertRaises(OperationError):
+        await rs.send_command('SLOW?', timeout=0.05)
+      self.assertEqual(rs._ids.quarantined, 1)
+      results = await asyncio.gather(*[rs.send_result_command('PNLCNF') for i in range(60)])
+      self.assertEqual(set(results), {'RP432MP'})
+    finally:
+      await rs.disconnect()
+
+  async def test_error_reply_fails_the_oldest_command(self):
+    self.panel.responses.update({'A?': 'N05', 'X?': 'X=1', 'Y?': 'Y=2', 'Z?': 'Z=3'})
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234')
+    await rs.connect()
+    try:
+      results = await asyncio.gather(*[rs.send_command(c, timeout=1) for c in ['A?', 'X?', 'Y?', 'Z?']], return_exceptions=True)
+      self.assertIsInstance(results[0], OperationError)
+      self.assertEqual(results[1:], ['X=1', 'Y=2', 'Z=3'])
+    finally:
+      await rs.disconnect()
+
+  async def test_adaptive_concurrency(self):
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234', adaptive_concurrency=True)
+    await rs.connect()
+    try:
+      await asyncio.gather(*[rs.send_result_command('PNLCNF') for i in range(200)])
+      stats = rs.window_stats
+      self.assertTrue(1 <= stats['window'] <= 49)
+      self.assertEqual(stats['in_flight'], 0)
+      self.assertGreater(stats['rtt'], 0)
+    finally:
+      await rs.disconnect()
+
+  async def test_cancelled_command_counts_as_error(self):
+    self.panel.responses['SLOW?'] = lambda command: None
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234', adaptive_concurrency=True)
+    await rs.connect()
+    try:
+      window, rtt = rs.window_stats['window'], rs.window_stats['rtt']
+      with self.assertRaises(asyncio.TimeoutError):
+        await asyncio.wait_for(rs.send_command('SLOW?'), 0.05)
+      self.assertLess(rs.window_stats['window'], window)
+      self.assertEqual(rs.window_stats['rtt'], rtt)
+    finally:
+      await rs.disconnect()
+
+  async def test_keep_alive_skipped_while_traffic_flows(self):
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234', keep_alive_interval=0.05)
+    await rs.connect()
+    try:
+      for i in range(10):
+        await rs.send_result_command('PNLCNF')
+        await asyncio.sleep(0.01)
+      self.assertNotIn('CLOCK', self.panel.received)
+      await _wait_until(lambda: 'CLOCK' in self.panel.received)
+      await _wait_until(lambda: rs.health['rtt'] is not None)
+      self.assertGreater(rs.health['score'], 0.9)
+    finally:
+      await rs.disconnect()
+
+  async def test_keep_alive_detects_dead_link(self):
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234', keep_alive_interval=0.05, keep_alive_timeout=0.1)
+    await rs.connect()
+    queue = rs.queue
+    # the panel stops answering, without closing the connection
+    self.panel.responses['CLOCK'] = lambda command: None
+    error = await asyncio.wait_for(queue.get(), 1)
+    self.assertIsInstance(error, ConnectionResetError)
+    self.assertEqual(rs.health['failed_probes'], 1)
+    await rs._close()
+
+  async def test_coalesce_status(self):
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234', coalesce_status=True)
+    await rs.connect()
+    try:
+      for status in ['ZSTT3=A', 'EVENT=1', 'ZSTT3=-', 'ZSTT3=O']:
+        self.panel.push(status)
+      await _wait_until(lambda: self.panel.received.count('ACK') == 4)
+      self.assertEqual(rs.queue.qsize(), 2)
+      self.assertEqual(rs.queue.get_nowait(), 'ZSTT3=O')
+      self.assertEqual(rs.queue.get_nowait(), 'EVENT=1')
+    finally:
+      await rs.disconnect()
+
+  async def test_queued_reply_keeps_order_with_pushes(self):
+    def _status(command):
+      self.panel.push('ZSTT3=A')
+      return 'ZSTT*3=O'
+    self.panel.responses['ZSTT*3?'] = _status
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234')
+    await rs.connect()
+    try:
+      self.assertEqual(await rs.send_command('ZSTT*3?', queue_reply=True), 'ZSTT*3=O')
+      self.assertEqual(await rs.send_command('ZSTT*3?'), 'ZSTT*3=O')
+      self.assertEqual([rs.queue.get_nowait() for i in range(rs.queue.qsize())], ['ZSTT3=A', 'ZSTT*3=O', 'ZSTT3=A'])
+    finally:
+      await rs.disconnect()
+
+  async def test_reconnect_cooldown(self):
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234', reconnect_cooldown=0.2)
+    await rs.connect()
+    start = time.monotonic()
+    await rs.disconnect()
+    self.assertLess(time.monotonic() - start, 0.2)
+    # another panel is not held up
+    other = FakePanel({})
+    await other.start()
+    try:
+      rs2 = RiscoSocket('127.0.0.1', other.port, '1234', reconnect_cooldown=0.2)
+      await rs2.connect()
+      self.assertLess(time.monotonic() - start, 0.2)
+      await rs2.disconnect()
+    finally:
+      await other.stop()
+    await rs.connect()
+    self.assertGreaterEqual(time.monotonic() - start, 0.2)
+    await rs.disconnect()
+
+  async def test_commands_on_dead_link_raise_operation_error(self):
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234')
+    await rs.connect()
+    try:
+      self.panel.drop()
+      await asyncio.wait_for(rs.queue.get(), 1)
+      for i in range(3):
+        with self.assertRaises(OperationError):
+          await rs.send_command('PNLCNF', timeout=0.05)
+    finally:
+      await rs.close()
+
+  async def test_read_only_queries_are_shared(self):
+    self.panel.responses['SYSLBL?'] = 'SYSLBL=House'
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234', query_cache_ttl=60)
+    await rs.connect()
+    try:
+      results = await asyncio.gather(*[rs.send_result_command('SYSLBL?') for i in range(10)])
+      self.assertEqual(set(results), {'House'})
+      self.assertEqual(await rs.send_result_command('SYSLBL?'), 'House')
+      self.assertEqual(self.panel.received.count('SYSLBL?'), 1)
+      self.assertEqual(rs.query_stats, {'hits': 1, 'shared': 9, 'misses': 1})
+      self.panel.responses['SYSLBL=Home'] = 'ACK'
+      self.assertTrue(await rs.send_ack_command('SYSLBL=Home'))
+      self.panel.responses['SYSLBL?'] = 'SYSLBL=Home'
+      self.assertEqual(await rs.send_result_command('SYSLBL?'), 'Home')
+    finally:
+      await rs.disconnect()
+
+  async def test_protocol_transport_connection_lost(self):
+    rs = RiscoSocket('127.0.0.1', self.panel.port, '1234', transport=TRANSPORT_PROTOCOL)
+    await rs.connect()
+    queue = rs.queue
+    self.panel.drop()
+    self.assertIsInstance(await asyncio.wait_for(queue.get(), 1), ConnectionResetError)
+    await rs._close()
+
+
+if __name__ == '__main__':
+  unittest.main()
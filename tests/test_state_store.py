@@ -0,0 +1,50 @@
+import unittest
+from pyrisco.local.partition import Partition
+from pyrisco.local.state_store import StateStore, ZONE, PARTITION, SYSTEM
+from pyrisco.local.system import System
+from pyrisco.local.zone import Zone
+
+
+class TestStateStore(unittest.TestCase):
+
+  def setUp(self):
+    self.store = StateStore()
+    self.zones = {i: Zone(None, i, '----', 3, f'Zone {i}', '1', '0', 'W') for i in range(1, 4)}
+    self.partition = Partition(None, 1, 'Home', '-E-R')
+    self.store.update(SYSTEM, None, System(None, 'House', '----'))
+    self.store.update(PARTITION, 1, self.partition)
+    for z in self.zones.values():
+      self.store.update(ZONE, z.id, z)
+
+  def test_changes_since(self):
+    seq = self.store.seq
+    self.assertEqual(seq, 5)
+    self.assertEqual(self.store.changes_since(seq), [])
+    self.zones[2].update_status('O---')
+    self.store.update(ZONE, 2, self.zones[2])
+    self.partition.update_status('-EA-')
+    self.store.update(PARTITION, 1, self.partition)
+    self.zones[2].update_status('----')
+    self.store.update(ZONE, 2, self.zones[2])
+    changes = self.store.changes_since(seq)
+    self.assertEqual([(s, kind, i) for s, kind, i, entity in changes], [(7, PARTITION, 1), (8, ZONE, 2)])
+    self.assertTrue(changes[0][3].armed)
+    self.assertEqual(len(self.store.changes_since(0)), 5)
+
+  def test_snapshot_is_immutable_and_shares_unchanged_entities(self):
+    before = self.store.snapshot()
+    self.assertIs(self.store.snapshot(), before)
+    self.zones[1].update_status('O---')
+    self.store.update(ZONE, 1, self.zones[1])
+    after = self.store.snapshot()
+    self.assertEqual((before.seq, after.seq), (5, 6))
+    self.assertFalse(before.zones[1].triggered)
+    self.assertTrue(after.zones[1].triggered)
+    self.assertIs(before.zones[2], after.zones[2])
+    self.assertEqual(after.system.name, 'House')
+    with self.assertRaises(TypeError):
+      after.zones[4] = None
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from pyrisco.local.status_queue import StatusQueue
+
+
+class TestStatusQueue(unittest.IsolatedAsyncioTestCase):
+
+  async def test_latest_status_wins(self):
+    queue = StatusQueue()
+    for item in ['ZSTT1=---A', 'EVENT=one', 'PSTT1=---', 'ZSTT1=----', 'EVENT=two', 'ZSTT1=A---', 'ZSTT2=----']:
+      queue.put_nowait(item)
+    self.assertEqual(queue.qsize(), 5)
+    self.assertEqual(queue.coalesced, 2)
+    items = [await queue.get() for i in range(5)]
+    self.assertEqual(items, ['ZSTT1=A---', 'EVENT=one', 'PSTT1=---', 'EVENT=two', 'ZSTT2=----'])
+
+  async def test_reply_to_status_query_is_kept_as_marker(self):
+    queue = StatusQueue()
+    for item in ['ZSTT1=A---', 'ZSTT*1=----', 'ZSTT1=O---', 'ZSTT*2=----']:
+      queue.put_nowait(item)
+    self.assertEqual([queue.get_nowait() for i in range(2)], ['ZSTT*1=O---', 'ZSTT*2=----'])
+
+  async def test_other_items_are_never_coalesced(self):
+    queue = StatusQueue()
+    error = ConnectionResetError()
+    for item in ['EVENT=one', 'EVENT=one', 'OUTPUT1=1', 'OUTPUT1=1', error]:
+      queue.put_nowait(item)
+    self.assertEqual([queue.get_nowait() for i in range(5)], ['EVENT=one', 'EVENT=one', 'OUTPUT1=1', 'OUTPUT1=1', error])
+    self.assertTrue(queue.empty())
+
+  async def test_status_after_delivery_is_queued_again(self):
+    queue = StatusQueue()
+    queue.put_nowait('SSTT=a')
+    self.assertEqual(queue.get_nowait(), 'SSTT=a')
+    queue.put_nowait('SSTT=b')
+    queue.put_nowait('SSTT=c')
+    self.assertEqual(queue.get_nowait(), 'SSTT=c')
+    queue.task_done()
+    queue.task_done()
+    await queue.join()
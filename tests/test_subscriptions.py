@@ -0,0 +1,39 @@
+import unittest
+from pyrisco.local.subscriptions import Subscriptions
+
+DIMENSIONS = ('zone_ids', 'partitions', 'groups')
+
+
+def _zone(zone_id, partitions=(1,), groups=()):
+  return {'zone_ids': (zone_id,), 'partitions': partitions, 'groups': groups}
+
+
+class TestSubscriptions(unittest.TestCase):
+
+  def test_filters(self):
+    subscriptions = Subscriptions(DIMENSIONS)
+    subscriptions.add('all')
+    subscriptions.add('zones', zone_ids=[1, 2])
+    subscriptions.add('partition 2', partitions=[2])
+    subscriptions.add('zone 3 in group A', zone_ids=[3], groups=['A'])
+    subscriptions.add('triggered', mask=1)
+    self.assertEqual(subscriptions.handlers(_zone(1), 2), ['all', 'zones'])
+    self.assertEqual(subscriptions.handlers(_zone(2, (1, 2)), 1), ['all', 'zones', 'partition 2', 'triggered'])
+    self.assertEqual(subscriptions.handlers(_zone(3, (1,), ('B',))), ['all', 'triggered'])
+    self.assertEqual(subscriptions.handlers(_zone(3, (1,), ('A',))), ['all', 'zone 3 in group A', 'triggered'])
+
+  def test_remove(self):
+    subscriptions = Subscriptions(DIMENSIONS)
+    remove_all = subscriptions.add('all')
+    remove_zones = subscriptions.add('zones', zone_ids=[1, 2])
+    subscriptions.add('zone 2', zone_ids=[2])
+    remove_zones()
+    self.assertEqual(subscriptions.handlers(_zone(2)), ['all', 'zone 2'])
+    self.assertEqual(subscriptions.handlers(_zone(1)), ['all'])
+    self.assertNotIn(('zone_ids', 1), subscriptions._index)
+    remove_all()
+    self.assertEqual(subscriptions.handlers(_zone(2)), ['zone 2'])
+
+
+if __name__ == '__main__':
+  unittest.main()